@@ -55,6 +55,20 @@ def create_app(config_class=Config):
     # Initialize cache
     init_cache(app)
     
+    # Stored TBA responses
+    from app.services.tba_store import tba_response_store
+    tba_response_store.init_app(app)
+    
+    # Call counts and latency for /metrics
+    from app.utils.metrics import init_metrics
+    init_metrics(app)
+    
+    # Cross-worker invalidation (cache clears, users, task status)
+    from app.utils.invalidation import invalidation_bus
+    from app.utils.cache import apply_cache_invalidation
+    invalidation_bus.init_app(app)
+    invalidation_bus.subscribe("cache", apply_cache_invalidation)
+    
     # Initialize task manager with the app
     task_manager.init_app(app)
     
@@ -62,6 +76,26 @@ def create_app(config_class=Config):
     os.makedirs(app.config["REPORTS_DIR"], exist_ok=True)
     os.makedirs(app.config["LOGS_DIR"], exist_ok=True)
     
+    # Pick the backup storage backend (Google Drive or a local directory)
+    from app.services.storage_backend import init_storage_backend
+    init_storage_backend(app)
+    
+    # Initialize the report store (in-memory JSON index or SQLite)
+    from app.services.report_index import report_index
+    from app.services.report_store import sqlite_report_store
+    report_index.init_app(app)
+    if app.config.get("REPORT_STORAGE") == "sqlite":
+        sqlite_report_store.init_app(app)
+    
+    # Start the background Drive upload queue
+    from app.services.upload_queue import upload_queue
+    upload_queue.init_app(app)
+    
+    # Segment archives for the bundled Drive backup
+    if app.config.get("DRIVE_BACKUP_MODE") == "archive":
+        from app.services.archive_service import report_archive
+        report_archive.init_app(app)
+    
     # Initialize user manager with the app and ensure it has the drive folder ID
     from app.services.user_service import user_manager
     print("Initializing user manager in app factory")
@@ -76,6 +110,7 @@ def create_app(config_class=Config):
     from app.blueprints.stats import stats_bp
     from app.blueprints.match_planner import planner_bp
     from app.blueprints.admin import admin_bp
+    from app.blueprints.metrics import metrics_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
@@ -84,6 +119,7 @@ def create_app(config_class=Config):
     app.register_blueprint(stats_bp)
     app.register_blueprint(planner_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
     
     # Error handlers
     from app.utils.error_handlers import register_error_handlers
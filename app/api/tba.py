@@ -1,33 +1,294 @@
+import os
+import time
+import random
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, Future
+from requests.adapters import HTTPAdapter
 from flask import current_app
 import datetime
-from app.utils.cache import tracked_memoize, cache
-from app.utils.cache_tracker import update_cache_info
+from app.utils.cache_tracker import update_cache_info, record_cache_hit, record_cache_miss
+from app.utils.metrics import timed_call, endpoint_label
+from app.services.tba_store import tba_response_store
+
+TBA_BASE_URL = "https://www.thebluealliance.com/api/v3"
+
+# Responses worth another try, TBA's servers return these under load
+RETRY_STATUSES = (500, 502, 503, 504)
+# First retry waits up to this long (seconds), doubling after that
+RETRY_BACKOFF = 0.25
+
+# How long (seconds) a stored response is served before it's revalidated, and
+# how much longer a stale one may still be served while that happens
+# Keyed by endpoint label (see endpoint_label), anything else gets the default
+ENDPOINT_POLICIES = {
+    "team/{id}": {"ttl": 86400, "max_stale": 7 * 86400},      # team data almost never changes
+    "events/{id}": {"ttl": 3600, "max_stale": 86400},
+    "event/{id}": {"ttl": 3600, "max_stale": 86400},
+    "event/{id}/oprs": {"ttl": 1800, "max_stale": 3600},      # OPRs change during events
+    "event/{id}/rankings": {"ttl": 120, "max_stale": 900},    # change after every match
+    "event/{id}/matches": {"ttl": 120, "max_stale": 900}
+}
+DEFAULT_POLICY = {"ttl": 3600, "max_stale": 3600}
+
+# Background revalidations running at once per worker
+REFRESH_WORKERS = 4
+# How often (seconds) a worker waiting on another worker's fetch checks the store
+LEASE_POLL_INTERVAL = 0.05
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+_refresh_pool = None
+_refresh_pid = None
+_refreshing = set()  # endpoints with a background revalidation queued or running
+_refresh_lock = threading.Lock()
+
+_inflight = {}  # endpoint -> Future for the fetch this worker has running
+_inflight_pid = None
+_inflight_lock = threading.Lock()
+
+def get_session():
+    # One keep-alive session per worker, so TBA calls reuse pooled
+    # connections instead of doing a TCP and TLS handshake every time
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            # Workers forked from a preloaded app mustn't share sockets with the parent
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                pool_size = current_app.config.get("TBA_POOL_SIZE", 10)
+                session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+def endpoint_policy(endpoint):
+    return ENDPOINT_POLICIES.get(endpoint_label(endpoint), DEFAULT_POLICY)
+
+def fetch(endpoint, etag=None, last_modified=None):
+    # Request an endpoint, conditionally if validators are given
+    # Connection failures and 5xx responses are retried a few times with
+    # jittered backoff, every attempt is timed for /metrics
+    # Returns (response, error), response is None if TBA couldn't be reached
+    url = f"{TBA_BASE_URL}/{endpoint}"
+    headers = {"X-TBA-Auth-Key": current_app.config["TBA_API_KEY"]}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    timeout = (current_app.config.get("TBA_CONNECT_TIMEOUT", 3.05), current_app.config.get("TBA_READ_TIMEOUT", 10))
+    max_retries = current_app.config.get("TBA_MAX_RETRIES", 2)
+    
+    for attempt in range(max_retries + 1):
+        response, error = None, None
+        with timed_call("tba", endpoint_label(endpoint)) as call:
+            try:
+                response = get_session().get(url, headers=headers, timeout=timeout)
+            except requests.RequestException as e:
+                error = e
+            if response is None or response.status_code not in (200, 304):
+                call.failed()
+        
+        # A read timeout isn't retried, it would only hold the request up longer
+        retryable = (isinstance(error, requests.ConnectionError) or
+                     (response is not None and response.status_code in RETRY_STATUSES))
+        if not retryable or attempt == max_retries:
+            break
+        time.sleep(RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1))
+    
+    if response is None:
+        print(f"Error fetching {endpoint} from TBA: {str(error)}")
+    return response, error
+
+def _lease_seconds():
+    # Long enough for a fetch with every retry, so a lease only expires if its holder is gone
+    config = current_app.config
+    attempt = config.get("TBA_CONNECT_TIMEOUT", 3.05) + config.get("TBA_READ_TIMEOUT", 10)
+    return attempt * (config.get("TBA_MAX_RETRIES", 2) + 1)
+
+def refresh_in_background(endpoint):
+    # Revalidate an endpoint on a background thread, at most once at a time per endpoint
+    global _refresh_pool, _refresh_pid
+    app = current_app._get_current_object()
+    with _refresh_lock:
+        if _refresh_pool is None or _refresh_pid != os.getpid():
+            # Workers forked from a preloaded app don't inherit the pool's threads
+            _refresh_pool = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix="tba-refresh")
+            _refresh_pid = os.getpid()
+            _refreshing.clear()
+        if endpoint in _refreshing:
+            return
+        _refreshing.add(endpoint)
+    
+    def run():
+        try:
+            with app.app_context():
+                # Another worker may have refreshed it in the meantime
+                entry = tba_response_store.get(endpoint)
+                if entry and time.time() - entry["fetched_at"] < endpoint_policy(endpoint)["ttl"]:
+                    return
+                TBAClient.refresh(endpoint, entry, wait=False)
+        except Exception as e:
+            print(f"Error refreshing {endpoint} from TBA: {str(e)}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(endpoint)
+    
+    _refresh_pool.submit(run)
 
 class TBAClient:
     # Communicate with the Blue Alliance API
     
     @staticmethod
-    @tracked_memoize(timeout=3600, cache_type='tba')  # Cache API responses for 1 hour
     def get_data(endpoint):
         # Get data from The Blue Alliance API
-        url = f"https://www.thebluealliance.com/api/v3/{endpoint}"
-        headers = {"X-TBA-Auth-Key": current_app.config["TBA_API_KEY"]}
+        #
+        # Responses are kept in the persistent TBA response store along with
+        # their ETag and Last-Modified. One older than its TTL is revalidated
+        # with a conditional request, and a 304 only restarts its clock, so
+        # unchanged data isn't downloaded again.
+        #
+        # In stale-while-revalidate mode a response past its TTL but within
+        # its max-stale window is returned right away and refreshed on a
+        # background thread, so no page waits on TBA for it. Past max-stale
+        # the page waits for a fresh copy.
+        policy = endpoint_policy(endpoint)
+        entry = tba_response_store.get(endpoint)
+        if entry:
+            age = time.time() - entry["fetched_at"]
+            if age < policy["ttl"]:
+                record_cache_hit('tba')
+                return entry["data"]
+            if current_app.config.get("TBA_STALE_WHILE_REVALIDATE", True) and age < policy["ttl"] + policy["max_stale"]:
+                record_cache_hit('tba')
+                refresh_in_background(endpoint)
+                return entry["data"]
         
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            return response.json()
+        record_cache_miss('tba')
+        return TBAClient.refresh(endpoint, entry)
+    
+    @staticmethod
+    def refresh(endpoint, entry=None, wait=True):
+        # Fetch an endpoint from TBA and store it, one fetch per endpoint at a time
+        #
+        # Inside a worker, the first caller runs the fetch and everyone who
+        # asks while it's running waits on its Future and gets the same
+        # result, errors included. Across workers a lease in the store does
+        # the same: whoever holds it fetches, the others poll the store until
+        # a newer copy or a failure shows up (or the lease runs out, and then
+        # fetch themselves). A failure is remembered for TBA_ERROR_TTL, so a
+        # failing endpoint is tried once per few seconds, not once per caller.
+        # Background refreshes (wait=False) just give up if someone is already on it.
+        global _inflight_pid
+        with _inflight_lock:
+            if _inflight_pid != os.getpid():
+                # Workers forked from a preloaded app don't inherit the fetching threads
+                _inflight.clear()
+                _inflight_pid = os.getpid()
+            future = _inflight.get(endpoint)
+            leader = future is None
+            if leader:
+                future = _inflight[endpoint] = Future()
+        
+        if not leader:
+            if not wait:
+                return entry["data"] if entry else {"error": "Refresh already in progress"}
+            return future.result()
+        
+        try:
+            result = TBAClient._refresh_shared(endpoint, entry, wait)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with _inflight_lock:
+                if _inflight.get(endpoint) is future:
+                    del _inflight[endpoint]
+    
+    @staticmethod
+    def _refresh_shared(endpoint, entry, wait):
+        # The cross-worker half of refresh: fetch under the store's lease, or wait for its holder
+        seen = entry["fetched_at"] if entry else 0
+        owner = f"{os.getpid()}-{threading.get_ident()}"
+        lease_seconds = _lease_seconds()
+        error_ttl = current_app.config.get("TBA_ERROR_TTL", 5)
+        
+        def finished_elsewhere():
+            fetched_at = tba_response_store.fetched_at(endpoint)
+            if fetched_at and fetched_at > seen:
+                return TBAClient._stored_data(endpoint, entry)
+            error = tba_response_store.recent_failure(endpoint, error_ttl)
+            if error:
+                return {"error": error}
+            return None
+        
+        result = finished_elsewhere()
+        if result is not None:
+            return result
+        
+        deadline = time.time() + lease_seconds
+        leased = tba_response_store.acquire_lease(endpoint, owner, lease_seconds)
+        while not leased:
+            if not wait:
+                return entry["data"] if entry else {"error": "Refresh already in progress"}
+            time.sleep(LEASE_POLL_INTERVAL)
+            result = finished_elsewhere()
+            if result is not None:
+                return result
+            if time.time() > deadline:
+                break
+            leased = tba_response_store.acquire_lease(endpoint, owner, lease_seconds)
+        
+        try:
+            return TBAClient._fetch_and_store(endpoint, entry)
+        finally:
+            if leased:
+                tba_response_store.release_lease(endpoint, owner)
+
+    @staticmethod
+    def _stored_data(endpoint, entry):
+        # The copy someone else just stored, falling back to ours if it vanished
+        latest = tba_response_store.get(endpoint)
+        if latest:
+            return latest["data"]
+        return entry["data"] if entry else TBAClient._fetch_and_store(endpoint, None)
+
+    @staticmethod
+    def _fetch_and_store(endpoint, entry):
+        # Fetch an endpoint from TBA (conditionally if there's a stored entry) and store it
+        now = time.time()
+        if entry:
+            response, error = fetch(endpoint, entry.get("etag"), entry.get("last_modified"))
         else:
-            return {"error": f"API request failed with status {response.status_code}"}
+            response, error = fetch(endpoint)
+        
+        if response is not None and response.status_code == 304 and entry:
+            tba_response_store.touch(endpoint, response.headers.get("ETag"), now)
+            return entry["data"]
+        if response is not None and response.status_code == 200:
+            data = response.json()
+            tba_response_store.put(endpoint, response.text, response.headers.get("ETag"),
+                                   response.headers.get("Last-Modified"), endpoint_policy(endpoint)["ttl"], now)
+            return data
+        
+        # Remembered briefly so other workers waiting on this fetch get the error too
+        if response is None:
+            message = f"API request failed: {type(error).__name__}"
+        else:
+            message = f"API request failed with status {response.status_code}"
+        tba_response_store.record_failure(endpoint, message)
+        return {"error": message}
     
     @staticmethod
-    @tracked_memoize(timeout=86400, cache_type='tba')  # Cache for 24 hours since team data almost never changes
     def get_team_info(team_number):
         # Get team information
         return TBAClient.get_data(f"team/frc{team_number}")
     
     @staticmethod
-    @tracked_memoize(timeout=1800, cache_type='tba')  # Cache for 30 minutes since OPRs change during events
     def get_team_oprs(event_key, team_number):
         # Get OPR data for a team at an event
         oprs = TBAClient.get_data(f"event/{event_key}/oprs")
@@ -41,10 +302,16 @@ class TBAClient:
         }
     
     @staticmethod
-    @tracked_memoize(timeout=3600, cache_type='tba')
     def get_events():
         # Get all events for {CURRENT YEAR}
         year = 2025
         
         events = TBAClient.get_data(f"events/{year}")
-        return events
\ No newline at end of file
+        return events
+    
+    @staticmethod
+    def clear_cache():
+        # Clear the stored TBA responses
+        # The store is shared by every worker, so there's nobody else to tell
+        tba_response_store.clear()
+        update_cache_info('tba', cleared=True, active=False, items=0)
@@ -2,10 +2,12 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app.blueprints.auth import admin_required
 from app.services.report_service import report_service
 from app.services.user_service import user_manager
+from app.services.upload_queue import upload_queue
+from app.services.tba_store import tba_response_store
 from app.api.tba import TBAClient
 from app.utils.site_settings import get_site_settings, save_site_settings
 from app.utils.logger import log_activity, get_recent_logs
-from app.utils.cache import cache
+from app.utils.cache import clear_all_caches, cache_sizes
 from app.utils.stats_utils import invalidate_team_stats_cache
 from app.utils.cache_tracker import get_cache_info, update_cache_info
 from app.utils.background_tasks import task_manager
@@ -28,19 +30,27 @@ def dashboard():
     # Get recent logs
     logs = get_recent_logs()
     
-    # Get cache info
+    # Get cache info, with the item counts the caches themselves report
     cache_info = get_cache_info()
+    sizes = cache_sizes()
+    for cache_type in ('general', 'stats'):
+        cache_info[cache_type]["item_count"] = sizes.get(cache_type, {}).get("items", 0)
+    cache_info['tba']["item_count"] = tba_response_store.stats()["count"]
     
     # Get task status for the dashboard
     sync_task_status = task_manager.get_task_status('sync_reports')
     
+    # Get pending Drive uploads
+    upload_stats = upload_queue.stats()
+    
     return render_template(
         "admin_dashboard.html",
         local_count=local_count,
         last_sync=last_sync,
         logs=logs,
         cache_info=cache_info,
-        task_status=sync_task_status
+        task_status=sync_task_status,
+        upload_stats=upload_stats
     )
 
 @admin_bp.route("/sync_status")
@@ -126,8 +136,8 @@ def user_management():
 @admin_bp.route("/clear_cache", methods=["POST"])
 @admin_required
 def clear_cache():
-    # Clear all cached data
-    cache.clear()
+    # Clear all cached data (in every worker)
+    clear_all_caches()
     update_cache_info('general', cleared=True, active=False, items=0)
     flash("Cache cleared successfully")
     log_activity("Admin Action", "Cleared application cache")
@@ -145,18 +155,25 @@ def clear_stats_cache():
 @admin_bp.route("/clear_tba_cache", methods=["POST"])
 @admin_required
 def clear_tba_cache():
-    # Clear TBA API cached data
-    # Find all TBA methods that are cached then delete them
-    for attr_name in dir(TBAClient):
-        attr = getattr(TBAClient, attr_name)
-        if hasattr(attr, 'uncached') and getattr(attr, 'cache_type', None) == 'tba':
-            cache.delete_memoized(attr)
-    
-    update_cache_info('tba', cleared=True, active=False, items=0)
+    # Clear TBA API cached data (in every worker)
+    TBAClient.clear_cache()
     flash("TBA API cache cleared successfully")
     log_activity("Admin Action", "Cleared TBA API cache")
     return redirect(url_for("admin.dashboard"))
 
+@admin_bp.route("/tba_cache")
+@admin_required
+def tba_cache():
+    # Stored TBA responses, optionally filtered by endpoint prefix
+    prefix = request.args.get("prefix", "").strip()
+    entries = tba_response_store.entries(prefix or None)
+    return render_template(
+        "admin_tba_cache.html",
+        entries=entries,
+        prefix=prefix,
+        store_stats=tba_response_store.stats()
+    )
+
 @admin_bp.route("/user/<username>/toggle_admin", methods=["POST"])
 @admin_required
 def toggle_admin_status(username):
@@ -107,26 +107,25 @@ def get_match_scouting_status(event_key):
     if not matches:
         return []
     
-    # Get all reports
-    all_reports = report_service.get_all_reports()
+    # Get only the reports for this event
+    event_reports = report_service.get_event_reports(event_key)
     
     # Build a dict of team numbers to count of reports
     team_scouted = {}
     match_scouted = {}  # Track which teams have been scouted in which matches
     
-    for report in all_reports:
-        if report.get("event") == event_key:
-            team_number = report.get("team_number")
-            match_number = report.get("match_number", "0")
-            
-            # Track if team has been scouted
-            if team_number:
-                team_scouted[team_number] = True
-            
-            # Track if team has been scouted in this specific match
-            if team_number and match_number:
-                match_key = f"{team_number}_{match_number}"
-                match_scouted[match_key] = True
+    for report in event_reports:
+        team_number = report.get("team_number")
+        match_number = report.get("match_number", "0")
+        
+        # Track if team has been scouted
+        if team_number:
+            team_scouted[team_number] = True
+        
+        # Track if team has been scouted in this specific match
+        if team_number and match_number:
+            match_key = f"{team_number}_{match_number}"
+            match_scouted[match_key] = True
     
     # Data for the match planner
     planner_data = []
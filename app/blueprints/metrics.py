@@ -0,0 +1,65 @@
+from flask import Blueprint, Response, request, current_app, abort
+from app.services.report_service import get_report_store
+from app.services.upload_queue import upload_queue
+from app.services.tba_store import tba_response_store
+from app.utils.cache import cache_sizes
+from app.utils.cache_tracker import get_cache_info, CACHE_TYPES
+from app.utils.metrics import MetricsWriter, collect_calls
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.before_request
+def restrict_metrics():
+    # Only the local collector (or whoever has METRICS_TOKEN) may scrape
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            abort(403)
+    elif request.remote_addr not in ("127.0.0.1", "::1"):
+        abort(403)
+
+@metrics_bp.route("/metrics")
+def metrics():
+    # Prometheus text format metrics for caches, outside calls and storage
+    writer = MetricsWriter()
+
+    cache_info = get_cache_info()
+    namespaces = sorted(set(CACHE_TYPES) | set(cache_info))
+    writer.metric("scouting_cache_hits_total", "counter", "Memoized calls answered from the cache",
+                  [({"namespace": ns}, cache_info.get(ns, {}).get("hits", 0)) for ns in namespaces])
+    writer.metric("scouting_cache_misses_total", "counter", "Memoized calls that ran the function",
+                  [({"namespace": ns}, cache_info.get(ns, {}).get("misses", 0)) for ns in namespaces])
+    writer.metric("scouting_cache_evictions_total", "counter", "Cache entries dropped by expiry or size limits",
+                  [({"namespace": ns}, cache_info.get(ns, {}).get("evictions", 0)) for ns in namespaces])
+
+    sizes = cache_sizes()
+    writer.metric("scouting_cache_items", "gauge", "Entries currently in the cache",
+                  [({"namespace": ns}, size.get("items", 0)) for ns, size in sorted(sizes.items())])
+    writer.metric("scouting_cache_bytes", "gauge", "Size of the entries currently in the cache",
+                  [({"namespace": ns}, size["bytes"]) for ns, size in sorted(sizes.items()) if "bytes" in size])
+
+    tba_responses = tba_response_store.stats()
+    writer.metric("scouting_tba_responses", "gauge", "TBA responses in the response store",
+                  [({}, tba_responses["count"])])
+    writer.metric("scouting_tba_response_bytes", "gauge", "Size of the stored TBA responses",
+                  [({}, tba_responses["bytes"])])
+
+    calls = sorted(collect_calls().items())
+    writer.metric("scouting_external_requests_total", "counter", "Calls to TBA and the backup storage",
+                  [({"service": service, "endpoint": endpoint, "outcome": outcome}, entry[outcome])
+                   for (service, endpoint), entry in calls for outcome in ("ok", "error")])
+    writer.histogram("scouting_external_request_duration_seconds", "Latency of calls to TBA and the backup storage",
+                     [({"service": service, "endpoint": endpoint}, entry) for (service, endpoint), entry in calls])
+
+    writer.metric("scouting_reports", "gauge", "Reports in the report store",
+                  [({}, get_report_store().count())])
+
+    queue = upload_queue.stats()
+    writer.metric("scouting_upload_queue_depth", "gauge", "Files waiting to be uploaded to the backup storage",
+                  [({}, queue["depth"])])
+    writer.metric("scouting_upload_queue_retrying", "gauge", "Queued uploads that have failed at least once",
+                  [({}, queue["retrying"])])
+    writer.metric("scouting_upload_queue_oldest_age_seconds", "gauge", "Age of the oldest queued upload",
+                  [({}, queue["oldest_age"] or 0)])
+
+    return Response(writer.render(), mimetype="text/plain; version=0.0.4")
@@ -10,17 +10,14 @@ def view_reports():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    # Get all reports
-    all_reports = report_service.get_all_reports()
+    # Only load the reports on this page
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    paginated_reports, total_reports = report_service.get_reports_page(page, per_page)
     
     # Pagination values
-    total_reports = len(all_reports)
     total_pages = (total_reports + per_page - 1) // per_page
     
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, total_reports)
-    paginated_reports = all_reports[start_idx:end_idx]
-    
     return render_template(
         "view_report.html", 
         reports=paginated_reports,
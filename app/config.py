@@ -10,6 +10,20 @@ class Config:
     
     # TBA API settings
     TBA_API_KEY = os.environ.get('TBA_API_KEY')
+    # Seconds to wait for a connection and for the response, and how many
+    # times a 5xx or failed connection is retried
+    TBA_CONNECT_TIMEOUT = float(os.environ.get('TBA_CONNECT_TIMEOUT', 3.05))
+    TBA_READ_TIMEOUT = float(os.environ.get('TBA_READ_TIMEOUT', 10))
+    TBA_MAX_RETRIES = int(os.environ.get('TBA_MAX_RETRIES', 2))
+    TBA_POOL_SIZE = int(os.environ.get('TBA_POOL_SIZE', 10))
+    # TBA responses, shared by every worker and kept across restarts
+    TBA_CACHE_DB = os.path.join("data", "tba_cache.db")
+    # How long (seconds) a failed TBA fetch is remembered, so every worker
+    # doesn't retry a failing endpoint on its own
+    TBA_ERROR_TTL = float(os.environ.get('TBA_ERROR_TTL', 5))
+    # Serve a stale TBA response while it's refreshed in the background
+    # (up to each endpoint's max-stale limit) instead of waiting on TBA
+    TBA_STALE_WHILE_REVALIDATE = os.environ.get('TBA_STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
     
     # Admin credentials - explicit loading
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME')
@@ -19,6 +33,58 @@ class Config:
     REPORTS_DIR = os.path.join("data", "reports")
     LOGS_DIR = os.path.join("data", "logs")
     
+    # How often (seconds) the report index checks the reports directory for
+    # files written by other workers
+    REPORT_INDEX_RESCAN_INTERVAL = int(os.environ.get('REPORT_INDEX_RESCAN_INTERVAL', 10))
+    
+    # Report storage engine: 'json' (loose files + in-memory index) or 'sqlite'
+    REPORT_STORAGE = os.environ.get('REPORT_STORAGE', 'json')
+    REPORTS_DB = os.path.join("data", "reports.db")
+    
     # Google Drive integration
     GOOGLE_CREDENTIALS_JSON = os.environ.get('GOOGLE_CREDENTIALS_JSON')
-    GOOGLE_DRIVE_FOLDER_ID = os.environ.get('GOOGLE_DRIVE_FOLDER_ID')
\ No newline at end of file
+    GOOGLE_DRIVE_FOLDER_ID = os.environ.get('GOOGLE_DRIVE_FOLDER_ID')
+    
+    # How long (seconds) site settings are served from the local copy before
+    # they are checked against Drive again
+    SITE_SETTINGS_TTL = int(os.environ.get('SITE_SETTINGS_TTL', 300))
+    
+    # Cache backend: 'sqlite' (shared by every worker and kept across restarts),
+    # 'filesystem' (shared, CACHE_DIR) or 'simple' (per worker, in memory)
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'sqlite')
+    CACHE_DB = os.path.join("data", "cache.db")
+    CACHE_DIR = os.path.join("data", "cache")
+    CACHE_DEFAULT_TIMEOUT = 300
+    CACHE_MAX_ITEMS = int(os.environ.get('CACHE_MAX_ITEMS', 5000))
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    CACHE_STATS_FLUSH_INTERVAL = int(os.environ.get('CACHE_STATS_FLUSH_INTERVAL', 30))
+    
+    # /metrics is only served to localhost unless a bearer token is set
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_FLUSH_INTERVAL = int(os.environ.get('METRICS_FLUSH_INTERVAL', 15))
+    
+    # Cross-worker invalidation events and shared state, polled at most once
+    # per interval (seconds) by every worker
+    INVALIDATION_DB = os.path.join("data", "invalidation.db")
+    INVALIDATION_POLL_INTERVAL = float(os.environ.get('INVALIDATION_POLL_INTERVAL', 1))
+    
+    # Backup storage backend: 'drive' or 'local' (a directory standing in for
+    # Drive, for running and benchmarking offline with simulated latency)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'drive')
+    STORAGE_LOCAL_DIR = os.environ.get('STORAGE_LOCAL_DIR', os.path.join("data", "local_drive"))
+    STORAGE_LOCAL_LATENCY_MS = int(os.environ.get('STORAGE_LOCAL_LATENCY_MS', 0))
+    
+    # Write-behind queue for Drive uploads
+    UPLOAD_QUEUE_DB = os.path.join("data", "upload_queue.db")
+    UPLOAD_QUEUE_BATCH_SIZE = int(os.environ.get('UPLOAD_QUEUE_BATCH_SIZE', 10))
+    UPLOAD_QUEUE_POLL_INTERVAL = int(os.environ.get('UPLOAD_QUEUE_POLL_INTERVAL', 5))
+    
+    # Drive backup layout: 'files' (one Drive file per report) or 'archive'
+    # (reports bundled into compressed per-event, per-hour segments)
+    DRIVE_BACKUP_MODE = os.environ.get('DRIVE_BACKUP_MODE', 'files')
+    ARCHIVE_DIR = os.path.join("data", "archives")
+    
+    # Drive sync tuning
+    DRIVE_SYNC_WORKERS = int(os.environ.get('DRIVE_SYNC_WORKERS', 8))
+    DRIVE_SYNC_PAGE_SIZE = int(os.environ.get('DRIVE_SYNC_PAGE_SIZE', 1000))
+    DRIVE_SYNC_MAX_RETRIES = int(os.environ.get('DRIVE_SYNC_MAX_RETRIES', 5))
\ No newline at end of file
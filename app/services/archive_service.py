@@ -0,0 +1,319 @@
+import os
+import re
+import gzip
+import json
+import zlib
+import hashlib
+import threading
+from app.services.storage_backend import get_storage_backend
+from app.services.sync_service import is_report_filename
+from app.services.upload_queue import upload_queue
+
+ARCHIVE_INDEX_NAME = "archive_index.json"
+SEGMENT_MIMETYPE = "application/gzip"
+
+# reports_{event}_{YYYYmmddHH}.jsonl.gz
+SEGMENT_FILENAME = re.compile(r'^reports_[A-Za-z0-9-]+_\d{10}\.jsonl\.gz$')
+
+class ReportArchive:
+    # Packs reports into a few compressed segment files for the Drive backup
+    #
+    # Reports are grouped by event and by the hour they were saved in. Each
+    # segment is a gzip file of JSON lines, and every append adds one more gzip
+    # member to the end of it, so a segment is never rewritten and readers just
+    # see one longer stream. An index lists which reports live in which
+    # segment; it is uploaded next to the segments, so a restore from Drive is
+    # one index download plus one download per segment we are missing data from.
+    #
+    # An upload replaces the Drive copy, and this instance's data/ may be empty
+    # or behind (a redeploy, a second instance). So before a segment's first
+    # upload in this process the Drive copy is downloaded and merged into the
+    # local one, and every index upload is merged with the index on Drive.
+
+    def __init__(self):
+        self.archive_dir = None
+        self._index = {}
+        self._lock = threading.Lock()
+        self._pulled = set()  # segments already merged with their Drive copy by this process
+
+    def init_app(self, app):
+        self.archive_dir = app.config["ARCHIVE_DIR"]
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self._index = {}
+        self._pulled = set()
+        upload_queue.register_preparer(self.is_archive_file, self.prepare_upload)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.archive_dir, ARCHIVE_INDEX_NAME)
+
+    @staticmethod
+    def segment_name(filename, report_data):
+        # Segment a report belongs in, from its event and the hour in its filename
+        event = re.sub(r'[^A-Za-z0-9]+', '-', str(report_data.get("event") or "")).strip('-') or "noevent"
+        match = re.search(r'_(\d{8})_(\d{2})\d{4}\.json$', filename)
+        hour = f"{match.group(1)}{match.group(2)}" if match else "0000000000"
+        return f"reports_{event}_{hour}.jsonl.gz"
+
+    def append(self, filename, report_data):
+        # Add a report to its segment and return the segment name
+        name = self.segment_name(filename, report_data)
+        self._append_entries(name, [{"filename": filename, "report": report_data}])
+        self.refresh_index()
+        return name
+
+    def _append_entries(self, name, entries):
+        # One gzip member per append, written with a single call so concurrent
+        # appends from other workers can't interleave inside a member
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with self._lock:
+            with open(os.path.join(self.archive_dir, name), 'ab') as f:
+                f.write(gzip.compress(lines.encode('utf-8')))
+
+    @staticmethod
+    def read_segment(data):
+        # Parse segment bytes into {filename: report}
+        # A member cut short by a crash only loses the entries inside it
+        reports = {}
+        while data:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                chunk = decompressor.decompress(data)
+            except zlib.error as e:
+                print(f"Stopping at damaged archive member: {str(e)}")
+                break
+
+            for line in chunk.decode('utf-8', errors='replace').splitlines():
+                try:
+                    entry = json.loads(line)
+                    reports[entry["filename"]] = entry["report"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+            if not decompressor.eof:
+                break
+            data = decompressor.unused_data
+        return reports
+
+    def load_segment(self, name):
+        path = os.path.join(self.archive_dir, name)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            return self.read_segment(f.read())
+
+    def load_index(self):
+        if not self._index and os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f).get("segments", {})
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error loading archive index, rebuilding it: {str(e)}")
+                self._index = {}
+        return self._index
+
+    def refresh_index(self):
+        # Bring the index in line with the segment files on disk
+        # Only segments whose size or mtime changed are read again, which also
+        # picks up appends made by other workers
+        index = self.load_index()
+        seen = set()
+        changed = False
+
+        for entry in os.scandir(self.archive_dir):
+            if not SEGMENT_FILENAME.match(entry.name):
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+
+            known = index.get(entry.name)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                continue
+
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+            _, event, hour = entry.name[:-len(".jsonl.gz")].rsplit('_', 2)
+            index[entry.name] = {
+                "event": event,
+                "hour": hour,
+                "reports": sorted(self.read_segment(data)),
+                "md5": hashlib.md5(data).hexdigest(),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime
+            }
+            changed = True
+
+        for name in list(index):
+            if name not in seen:
+                del index[name]
+                changed = True
+
+        if changed or not os.path.exists(self.index_path):
+            self._save_index(index)
+        return index
+
+    def _save_index(self, index):
+        # Write atomically, the index is uploaded straight from this file
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"segments": index}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def archived_filenames(self):
+        return {filename for segment in self.refresh_index().values() for filename in segment["reports"]}
+
+    def enqueue_upload(self, queue, folder_id, segment_names):
+        # Back up the given segments and the index through the upload queue
+        # The queue reads the files when it uploads, so later appends go up too
+        for name in segment_names:
+            queue.enqueue(name, folder_id=folder_id, source_path=os.path.join(self.archive_dir, name),
+                          mimetype=SEGMENT_MIMETYPE)
+        queue.enqueue(ARCHIVE_INDEX_NAME, folder_id=folder_id, source_path=self.index_path)
+
+    @staticmethod
+    def is_archive_file(name):
+        return name == ARCHIVE_INDEX_NAME or bool(SEGMENT_FILENAME.match(name))
+
+    def prepare_upload(self, name, folder_id, source_path):
+        # Content to upload for a queued segment or index, merged with the Drive copy
+        if name == ARCHIVE_INDEX_NAME:
+            return self._merged_index(folder_id)
+
+        if name not in self._pulled:
+            self.pull_segment(name, folder_id)
+        with open(source_path, 'rb') as f:
+            return f.read()
+
+    def pull_segment(self, name, folder_id):
+        # Merge the Drive copy of a segment into the local one
+        # Raises if Drive can't be read, so the upload waits instead of clobbering it
+        backend = get_storage_backend()
+        file = backend.find(name, folder_id)
+        if file:
+            remote_reports = self.read_segment(backend.get(file['id']))
+            local_reports = self.load_segment(name)
+            missing = [filename for filename in sorted(remote_reports) if filename not in local_reports]
+            if missing:
+                self._append_entries(name, [{"filename": filename, "report": remote_reports[filename]}
+                                            for filename in missing])
+                self.refresh_index()
+                print(f"Merged {len(missing)} reports from the Drive copy of {name}")
+        self._pulled.add(name)
+
+    def _merged_index(self, folder_id):
+        # The local index plus whatever the Drive index lists that we don't have
+        backend = get_storage_backend()
+        file = backend.find(ARCHIVE_INDEX_NAME, folder_id)
+        remote_index = {}
+        if file:
+            try:
+                remote_index = json.loads(backend.get(file['id'])).get("segments", {})
+            except (ValueError, AttributeError) as e:
+                print(f"Error parsing remote archive index, replacing it: {str(e)}")
+
+        merged = dict(remote_index)
+        for name, segment in self.refresh_index().items():
+            entry = dict(segment)
+            entry["reports"] = sorted(set(segment["reports"]) | set(remote_index.get(name, {}).get("reports", [])))
+            merged[name] = entry
+        return json.dumps({"segments": merged}, indent=2, sort_keys=True)
+
+    def sync_with_drive(self, reports_dir, folder_id, store, queue):
+        # Two-way sync of the archive with Drive
+        #
+        # 1. Local reports that aren't archived yet are appended to their segment
+        # 2. The remote index tells us which segments hold reports we don't have;
+        #    only those are downloaded, and their missing reports are restored
+        #    into the reports directory and merged into the local segment
+        # 3. Segments holding reports Drive doesn't have are queued for upload
+        stats = {"mode": "archive", "resumed": False, "skipped": 0, "synced": 0, "uploaded": 0,
+                 "failed": 0, "conflicts": 0, "total_drive": 0, "local_before": 0, "batches": 0}
+
+        local_files = {name for name in os.listdir(reports_dir) if is_report_filename(name)}
+        stats["local_before"] = len(local_files)
+        backend = get_storage_backend()
+
+        # 1. Backfill reports saved before archive mode was turned on
+        archived = self.archived_filenames()
+        backfill = {}
+        for filename in sorted(local_files - archived):
+            try:
+                with open(os.path.join(reports_dir, filename), 'r') as f:
+                    report_data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading {filename} for the archive: {str(e)}")
+                continue
+            entry = {"filename": filename, "report": report_data}
+            backfill.setdefault(self.segment_name(filename, report_data), []).append(entry)
+
+        for name, entries in backfill.items():
+            self._append_entries(name, entries)
+        if backfill:
+            print(f"Archived {sum(len(entries) for entries in backfill.values())} existing reports")
+
+        local_index = self.refresh_index()
+
+        # 2. Restore whatever Drive has that we don't
+        content = backend.get_by_name(ARCHIVE_INDEX_NAME, folder_id)
+        remote_index = {}
+        if content:
+            try:
+                remote_index = json.loads(content).get("segments", {})
+            except (ValueError, AttributeError) as e:
+                print(f"Error parsing remote archive index: {str(e)}")
+
+        stats["total_drive"] = sum(len(segment.get("reports", [])) for segment in remote_index.values())
+
+        for name, remote in remote_index.items():
+            if not SEGMENT_FILENAME.match(name):
+                continue
+            local_reports = set(local_index.get(name, {}).get("reports", []))
+            if set(remote.get("reports", [])) <= local_reports:
+                self._pulled.add(name)
+                stats["skipped"] += 1
+                continue
+
+            try:
+                file = backend.find(name, folder_id)
+                if not file:
+                    raise FileNotFoundError(f"{name} is listed in the archive index but not on Drive")
+                remote_reports = self.read_segment(backend.get(file['id']))
+                stats["batches"] += 1
+            except Exception as e:
+                print(f"Error downloading archive segment {name}: {str(e)}")
+                stats["failed"] += 1
+                continue
+
+            missing = [filename for filename in sorted(remote_reports) if filename not in local_reports]
+            for filename in missing:
+                if not is_report_filename(filename):
+                    continue
+                report_data = remote_reports[filename]
+                if filename not in local_files:
+                    with open(os.path.join(reports_dir, filename), 'w') as f:
+                        json.dump(report_data, f, indent=2)
+                    store.add(filename, report_data)
+                    local_files.add(filename)
+                    stats["synced"] += 1
+
+            if missing:
+                self._append_entries(name, [{"filename": filename, "report": remote_reports[filename]}
+                                            for filename in missing])
+            self._pulled.add(name)
+
+        local_index = self.refresh_index()
+
+        # 3. Back up segments Drive is missing reports from
+        uploads = [
+            name for name, segment in local_index.items()
+            if not set(segment["reports"]) <= set(remote_index.get(name, {}).get("reports", []))
+        ]
+        if uploads or set(local_index) != set(remote_index):
+            self.enqueue_upload(queue, folder_id, uploads)
+        stats["uploaded"] = len(uploads)
+
+        print(f"Archive sync: restored {stats['synced']} reports, queued {len(uploads)} segments, "
+              f"{stats['skipped']} segments already up to date")
+        return stats
+
+report_archive = ReportArchive()
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+class ReportIndex:
+    # Process-wide in-memory index of the local reports directory
+    #
+    # Every report is parsed once and kept in memory together with the mtime and
+    # size of its file. A refresh only stats the directory, so reports written by
+    # another worker (or edited by hand) are picked up without re-reading files
+    # that haven't changed. Writes made by this process update the index directly.
+    #
+    # Secondary indexes map team and event to the reports they contain, so
+    # per-team and per-event lookups never walk every report.
+
+    def __init__(self, rescan_interval=10):
+        self.reports_dir = None
+        self.rescan_interval = rescan_interval
+        self._entries = {}  # filename -> {"mtime", "size", "data"}
+        self._order = []  # (timestamp, filename) tuples, oldest first
+        self._by_team = {}  # team_number -> sorted (timestamp, filename) list
+        self._by_event = {}  # event -> sorted (timestamp, filename) list
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_scan = 0
+
+    def init_app(self, app):
+        self.reports_dir = app.config["REPORTS_DIR"]
+        self.rescan_interval = app.config.get("REPORT_INDEX_RESCAN_INTERVAL", self.rescan_interval)
+
+        # Drop anything loaded for a previous app
+        with self._lock:
+            self._entries = {}
+            self._order = []
+            self._by_team = {}
+            self._by_event = {}
+            self._loaded = False
+            self._last_scan = 0
+
+    def refresh(self, force=False):
+        # Pick up new, changed or deleted files by comparing mtime and size
+        # Only stats the directory, and at most once per rescan interval
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded and not force and now - self._last_scan < self.rescan_interval:
+                return
+
+            seen = set()
+            with os.scandir(self.reports_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    seen.add(entry.name)
+
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+
+                    cached = self._entries.get(entry.name)
+                    if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+                        continue
+
+                    self._load_file(entry.name, stat)
+
+            # Anything we know about that is no longer on disk was deleted
+            for filename in list(self._entries):
+                if filename not in seen:
+                    self._remove_entry(filename)
+
+            self._loaded = True
+            self._last_scan = time.monotonic()
+
+    def add(self, filename, report_data=None):
+        # Add or update a single report after it has been written to disk
+        # If report_data is not given the file is read back from disk
+        with self._lock:
+            path = os.path.join(self.reports_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._remove_entry(filename)
+                return None
+
+            if report_data is None:
+                return self._load_file(filename, stat)
+
+            report_data = dict(report_data)
+            self._normalize(filename, report_data)
+            self._set_entry(filename, stat, report_data)
+            return report_data
+
+    def remove(self, filename):
+        # Forget a report that was deleted from disk
+        with self._lock:
+            self._remove_entry(filename)
+
+    def all(self):
+        # All reports, newest first
+        # The returned dicts are shared with the index, so treat them as read-only
+        self.refresh()
+        with self._lock:
+            return [self._entries[filename]["data"] for _, filename in reversed(self._order)]
+
+    def page(self, offset, limit):
+        # A slice of the reports, newest first, plus the total count
+        # Only the requested slice is touched, the order is already sorted
+        self.refresh()
+        with self._lock:
+            total = len(self._order)
+            end = max(total - offset, 0)
+            start = max(end - limit, 0)
+            filenames = [filename for _, filename in reversed(self._order[start:end])]
+            return [self._entries[filename]["data"] for filename in filenames], total
+
+    def get(self, filename):
+        # Get a single report by filename
+        self.refresh()
+        with self._lock:
+            cached = self._entries.get(filename)
+            if cached:
+                return cached["data"]
+
+            # Another worker may have written it since the last rescan
+            if os.path.basename(filename) != filename or not filename.endswith('.json'):
+                return None
+            return self.add(filename)
+
+    def team(self, team_number):
+        # All reports for a team, newest first
+        return self._lookup(self._by_team, str(team_number))
+
+    def event(self, event_key):
+        # All reports for an event, newest first
+        return self._lookup(self._by_event, event_key)
+
+    def _lookup(self, secondary, key):
+        self.refresh()
+        with self._lock:
+            return [self._entries[filename]["data"] for _, filename in reversed(secondary.get(key, []))]
+
+    def count(self):
+        # Number of reports in the index
+        self.refresh()
+        with self._lock:
+            return len(self._entries)
+
+    def _load_file(self, filename, stat):
+        # Parse a report file and store it in the index
+        path = os.path.join(self.reports_dir, filename)
+        try:
+            with open(path, 'r') as f:
+                report_data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error parsing JSON from file {filename}: {e}")
+            self._remove_entry(filename)
+            return None
+
+        if not isinstance(report_data, dict):
+            print(f"Warning: File {filename} does not contain a report object")
+            self._remove_entry(filename)
+            return None
+
+        self._normalize(filename, report_data)
+        self._set_entry(filename, stat, report_data)
+        return report_data
+
+    def _normalize(self, filename, report_data):
+        # Fill in the fields the rest of the app relies on
+        report_data["filename"] = filename
+
+        if "team_number" not in report_data:
+            print(f"Warning: File {filename} missing required field 'team_number'")
+            report_data["team_number"] = filename.split('_')[0] if '_' in filename else "unknown"
+
+    def _set_entry(self, filename, stat, report_data):
+        # Store an entry and keep the timestamp order sorted
+        self._remove_entry(filename)
+        self._entries[filename] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "data": report_data
+        }
+        entry = (self._sort_key(report_data), filename)
+        bisect.insort(self._order, entry)
+        for secondary, key in self._secondary_keys(report_data):
+            bisect.insort(secondary.setdefault(key, []), entry)
+
+    def _remove_entry(self, filename):
+        # Remove an entry and its position in the timestamp order
+        cached = self._entries.pop(filename, None)
+        if not cached:
+            return
+
+        entry = (self._sort_key(cached["data"]), filename)
+        self._discard(self._order, entry)
+        for secondary, key in self._secondary_keys(cached["data"]):
+            bucket = secondary.get(key)
+            if bucket is not None:
+                self._discard(bucket, entry)
+                if not bucket:
+                    del secondary[key]
+
+    def _secondary_keys(self, report_data):
+        # The (index, key) pairs a report is listed under
+        team_number = str(report_data.get("team_number"))
+        event_key = report_data.get("event")
+
+        keys = [(self._by_team, team_number)]
+        if event_key:
+            keys.append((self._by_event, event_key))
+        return keys
+
+    @staticmethod
+    def _discard(sorted_list, entry):
+        position = bisect.bisect_left(sorted_list, entry)
+        if position < len(sorted_list) and sorted_list[position] == entry:
+            del sorted_list[position]
+
+    @staticmethod
+    def _sort_key(report_data):
+        timestamp = report_data.get("timestamp", "")
+        return timestamp if isinstance(timestamp, str) else str(timestamp)
+
+report_index = ReportIndex()
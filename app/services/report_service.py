@@ -1,11 +1,21 @@
 import os
 import json
-import time
-import math
 import datetime
 from flask import current_app
 from app.models.report import Report
-from drive_integration import upload_to_drive, download_file_from_drive, find_file_by_name, get_all_files_from_drive
+from app.services.report_index import report_index
+from app.services.report_store import sqlite_report_store
+from app.services.upload_queue import upload_queue
+from app.services.sync_service import ReportSyncer, count_local_reports
+from app.services.archive_service import report_archive
+from app.services.storage_backend import get_storage_backend
+from app.utils.stats_utils import invalidate_team_stats_cache
+
+def get_report_store():
+    # The configured report storage engine (in-memory JSON index or SQLite)
+    if current_app.config.get("REPORT_STORAGE") == "sqlite":
+        return sqlite_report_store
+    return report_index
 
 class ReportService:
     # Service for managing scouting reports
@@ -31,134 +41,71 @@ class ReportService:
         with open(local_path, 'w') as f:
             json.dump(report_dict, f, indent=2)
         
-        # Backup to Google Drive
-        drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
-        file_id = upload_to_drive(report_dict, filename, drive_folder_id)
+        # Keep the report store current without rescanning the directory
+        get_report_store().add(filename, report_dict)
         
-        if not file_id:
-            print("Failed to upload report to Google Drive, but saved locally")
+        # Backup to Google Drive in the background so the request returns right away
+        drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
+        if current_app.config.get("DRIVE_BACKUP_MODE") == "archive":
+            segment = report_archive.append(filename, report_dict)
+            report_archive.enqueue_upload(upload_queue, drive_folder_id, [segment])
+        else:
+            upload_queue.enqueue(filename, report_dict, drive_folder_id)
         
         return filename
         
     @staticmethod
     def get_all_reports():
-        # Gets all scouting reports from local storage
-        reports = []
-        reports_dir = current_app.config["REPORTS_DIR"]
-        
-        # Get all JSON files from the reports directory
-        for filename in os.listdir(reports_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(reports_dir, filename)
-                try:
-                    with open(file_path, 'r') as f:
-                        report_data = json.load(f)
-                        report_data["filename"] = filename  # Add filename to the report
-                        
-                        # Make sure required fields exist
-                        if "team_number" not in report_data:
-                            print(f"Warning: File {filename} missing required field 'team_number'")
-                            report_data["team_number"] = filename.split('_')[0] if '_' in filename else "unknown"
-                        
-                        reports.append(report_data)
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing JSON from file {filename}: {e}")
-        
-        # Sort reports by timestamp (newest first)
-        reports.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        
-        return reports
+        # Gets all scouting reports from the report store (newest first)
+        return get_report_store().all()
+    
+    @staticmethod
+    def get_reports_page(page=1, per_page=10):
+        # Get one page of reports (newest first) and the total number of reports
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        return get_report_store().page((page - 1) * per_page, per_page)
     
     @staticmethod
     def get_report(filename):
         # Get a specific report by filename
-        reports_dir = current_app.config["REPORTS_DIR"]
-        file_path = os.path.join(reports_dir, filename)
-        
-        if not os.path.exists(file_path):
-            return None
-        
-        try:
-            with open(file_path, 'r') as f:
-                report_data = json.load(f)
-                report_data["filename"] = filename
-                return report_data
-        except:
-            return None
+        return get_report_store().get(filename)
     
     @staticmethod
     def get_team_reports(team_number):
         # Get all reports for a specific team
-        all_reports = ReportService.get_all_reports()
-        team_reports = [r for r in all_reports if r.get("team_number") == str(team_number)]
-        return team_reports
+        return get_report_store().team(team_number)
+    
+    @staticmethod
+    def get_event_reports(event_key):
+        # Get all reports for a specific event
+        return get_report_store().event(event_key)
     
     @staticmethod
     def sync_reports_from_drive():
-        # Sync reports from Google Drive in small batches to prevent timeouts
-        reports_dir = current_app.config["REPORTS_DIR"]
-        drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
-        
-        # Get list of local files
-        local_files = set(os.listdir(reports_dir))
-        
-        synced_count = 0
-        failed_count = 0
-        batch_count = 0
-        total_drive_files = 0
-        
-        # Use pagination to get files in smaller batches from Drive
-        next_page_token = None
+        # Two-way sync of reports with Google Drive (full listing the first time, changes feed after that)
+        if current_app.config.get("DRIVE_BACKUP_MODE") == "archive":
+            return ReportService.sync_archive_with_drive()
+        
+        syncer = ReportSyncer(
+            current_app.config["REPORTS_DIR"],
+            current_app.config["GOOGLE_DRIVE_FOLDER_ID"],
+            get_report_store(),
+            os.path.join("data", "drive_changes_token.txt"),
+            os.path.join("data", "sync_manifest.json"),
+            os.path.join("data", "sync_checkpoint.json"),
+            workers=current_app.config["DRIVE_SYNC_WORKERS"],
+            page_size=current_app.config["DRIVE_SYNC_PAGE_SIZE"],
+            max_retries=current_app.config["DRIVE_SYNC_MAX_RETRIES"]
+        )
+        stats = syncer.stats
         
         try:
-            while True:
-                batch_count += 1
-                print(f"Fetching file list batch #{batch_count} from Google Drive")
-                
-                # Get a batch of files from Drive
-                result = get_all_files_from_drive(drive_folder_id, page_size=10, page_token=next_page_token)
-                drive_files_batch = result["files"]
-                next_page_token = result["nextPageToken"]
-                
-                total_drive_files += len(drive_files_batch)
-                
-                # Filter files that need to be downloaded
-                files_to_download = [
-                    file for file in drive_files_batch 
-                    if file['name'] not in local_files and file['name'].endswith('.json')
-                ]
-                
-                # Process in smaller download batches
-                download_batch_size = 5
-                download_batches = math.ceil(len(files_to_download) / download_batch_size)
-                
-                for i in range(0, len(files_to_download), download_batch_size):
-                    download_batch = files_to_download[i:i+download_batch_size]
-                    current_batch = i // download_batch_size + 1
-                    print(f"Processing download batch {current_batch}/{download_batches} ({len(download_batch)} files)")
-                    
-                    for file in download_batch:
-                        file_content = download_file_from_drive(file['id'])
-                        if file_content:
-                            local_path = os.path.join(reports_dir, file['name'])
-                            try:
-                                with open(local_path, 'w') as f:
-                                    f.write(file_content)
-                                synced_count += 1
-                            except Exception as e:
-                                failed_count += 1
-                                print(f"Error saving {file['name']} locally: {str(e)}")
-                    
-                    # Add a pause between download batches
-                    if i + download_batch_size < len(files_to_download):
-                        time.sleep(5)  # 5 second pause between download batches
-                
-                # If no more pages, break the loop
-                if not next_page_token:
-                    break
-                    
-                # Pause between fetching file list batches
-                time.sleep(5)  # 5 second pause between file listing batches
+            syncer.run()
+            
+            # Downloads can replace a report in place, which the stats version doesn't see
+            if stats["synced"]:
+                invalidate_team_stats_cache()
             
             # Save last sync time
             with open(os.path.join("data", "last_sync.txt"), 'w') as f:
@@ -168,29 +115,71 @@ class ReportService:
             users_result = ReportService.sync_users_from_drive()
             
             return {
-                "synced": synced_count,
-                "failed": failed_count,
-                "total_drive": total_drive_files,
-                "total_local": len(local_files) + synced_count,
-                "batches": batch_count,
+                "mode": stats["mode"],
+                "resumed": stats["resumed"],
+                "skipped": stats["skipped"],
+                "synced": stats["synced"],
+                "uploaded": stats["uploaded"],
+                "failed": stats["failed"],
+                "conflicts": stats["conflicts"],
+                "total_drive": stats["total_drive"],
+                "total_local": count_local_reports(current_app.config["REPORTS_DIR"]),
+                "batches": stats["batches"],
+                "throughput": syncer.throughput(),
                 "users_result": users_result
             }
             
         except Exception as e:
             print(f"Error during sync: {str(e)}")
+            # Progress is checkpointed, so the next sync resumes from here
             # Save partial results even if there's an error
             with open(os.path.join("data", "last_sync.txt"), 'w') as f:
                 f.write(f"ERROR: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
             return {
-                "synced": synced_count,
-                "failed": failed_count + 1, # Count the error
-                "total_drive": total_drive_files,
-                "total_local": len(local_files) + synced_count,
-                "batches": batch_count,
+                "mode": stats["mode"],
+                "resumed": stats["resumed"],
+                "skipped": stats["skipped"],
+                "synced": stats["synced"],
+                "uploaded": stats["uploaded"],
+                "failed": stats["failed"] + 1, # Count the error
+                "conflicts": stats["conflicts"],
+                "total_drive": stats["total_drive"],
+                "total_local": count_local_reports(current_app.config["REPORTS_DIR"]),
+                "batches": stats["batches"],
+                "throughput": syncer.throughput(),
                 "error": str(e)
             }
     
+    @staticmethod
+    def sync_archive_with_drive():
+        # Sync the bundled segment archives with Google Drive (archive backup mode)
+        stats = {"mode": "archive", "resumed": False, "skipped": 0, "synced": 0, "uploaded": 0,
+                 "failed": 0, "conflicts": 0, "total_drive": 0, "local_before": 0, "batches": 0}
+        
+        try:
+            stats = report_archive.sync_with_drive(
+                current_app.config["REPORTS_DIR"],
+                current_app.config["GOOGLE_DRIVE_FOLDER_ID"],
+                get_report_store(),
+                upload_queue
+            )
+            
+            with open(os.path.join("data", "last_sync.txt"), 'w') as f:
+                f.write(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            
+            result = dict(stats, total_local=count_local_reports(current_app.config["REPORTS_DIR"]), throughput=None)
+            result["users_result"] = ReportService.sync_users_from_drive()
+            return result
+        
+        except Exception as e:
+            print(f"Error during archive sync: {str(e)}")
+            with open(os.path.join("data", "last_sync.txt"), 'w') as f:
+                f.write(f"ERROR: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            
+            return dict(stats, failed=stats["failed"] + 1, total_local=count_local_reports(current_app.config["REPORTS_DIR"]),
+                        throughput=None, error=str(e))
+    
     @staticmethod
     def sync_users_from_drive():
         # Sync users from Google Drive
@@ -198,19 +187,11 @@ class ReportService:
         
         print(f"Syncing users from Google Drive folder ID: {drive_folder_id}")
         
-        # Find users file in Drive
-        file_info = find_file_by_name("users.json", drive_folder_id)
-        
-        if not file_info:
-            print("No users.json file found on Google Drive")
-            return {"status": "No users file found on Drive"}
-        
-        # Download users file
-        print(f"Downloading users.json with ID: {file_info['id']}")
-        content = download_file_from_drive(file_info['id'])
+        # Download users file (the file ID is usually cached, so this is one request)
+        content = get_storage_backend().get_by_name("users.json", drive_folder_id)
         if not content:
-            print("Failed to download users.json content")
-            return {"status": "Failed to download users file"}
+            print("Could not download users.json from Google Drive")
+            return {"status": "No users file found on Drive"}
         
         try:
             drive_users = json.loads(content)
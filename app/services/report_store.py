@@ -0,0 +1,197 @@
+import os
+import json
+import sqlite3
+import threading
+import click
+
+class SQLiteReportStore:
+    # Optional SQLite storage engine for scouting reports
+    #
+    # Reports live in a single database file running in WAL mode, so several
+    # gunicorn workers can read and write the same store at once. Lookups by
+    # team and event use indexes instead of scanning every report.
+    # Loose JSON files are still written next to it for the Drive backup.
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS reports (
+            filename TEXT PRIMARY KEY,
+            team_number TEXT,
+            event TEXT,
+            match_number TEXT,
+            timestamp TEXT,
+            body TEXT NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_reports_team ON reports (team_number, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_reports_event ON reports (event, timestamp)",
+        # Nothing looks reports up by match, so stores created with this index drop it
+        "DROP INDEX IF EXISTS idx_reports_match",
+        "CREATE INDEX IF NOT EXISTS idx_reports_timestamp ON reports (timestamp)",
+        """CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )"""
+    ]
+
+    def __init__(self):
+        self.db_path = None
+        self.reports_dir = None
+        self._pid = None
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.db_path = app.config["REPORTS_DB"]
+        self.reports_dir = app.config["REPORTS_DIR"]
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+        # One-shot import of the loose JSON files
+        if not self._get_meta("json_migrated"):
+            imported = self.migrate_from_json()
+            print(f"Migrated {imported} JSON reports into {self.db_path}")
+
+        app.cli.add_command(migrate_reports_command)
+
+    def _connect(self):
+        # One connection per thread, sqlite3 connections can't be shared
+        # Workers forked from a preloaded app (which ran the migration) get their own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_meta(self, key):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate_from_json(self, reports_dir=None):
+        # Import every data/reports/*.json file that isn't in the database yet
+        reports_dir = reports_dir or self.reports_dir
+        imported = 0
+
+        if os.path.isdir(reports_dir):
+            conn = self._connect()
+            known = {row[0] for row in conn.execute("SELECT filename FROM reports")}
+
+            with conn:
+                for filename in sorted(os.listdir(reports_dir)):
+                    if not filename.endswith('.json') or filename in known:
+                        continue
+
+                    try:
+                        with open(os.path.join(reports_dir, filename), 'r') as f:
+                            report_data = json.load(f)
+                    except (OSError, json.JSONDecodeError) as e:
+                        print(f"Error parsing JSON from file {filename}: {e}")
+                        continue
+
+                    if not isinstance(report_data, dict):
+                        continue
+
+                    self._insert(conn, filename, report_data)
+                    imported += 1
+
+        self._set_meta("json_migrated", "1")
+        return imported
+
+    def add(self, filename, report_data=None):
+        # Insert or replace a report
+        # If report_data is not given the JSON file is read from the reports directory
+        if report_data is None:
+            try:
+                with open(os.path.join(self.reports_dir, filename), 'r') as f:
+                    report_data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error parsing JSON from file {filename}: {e}")
+                return None
+
+        report_data = dict(report_data)
+        conn = self._connect()
+        with conn:
+            self._insert(conn, filename, report_data)
+        return report_data
+
+    def remove(self, filename):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM reports WHERE filename = ?", (filename,))
+
+    def all(self):
+        # All reports, newest first
+        return self._query("SELECT body FROM reports ORDER BY timestamp DESC")
+
+    def page(self, offset, limit):
+        # A slice of the reports, newest first, plus the total count
+        # Walks the timestamp index, so only the requested rows are decoded
+        reports = self._query(
+            "SELECT body FROM reports ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+        return reports, self.count()
+
+    def get(self, filename):
+        rows = self._query("SELECT body FROM reports WHERE filename = ?", (filename,))
+        return rows[0] if rows else None
+
+    def team(self, team_number):
+        # All reports for a team, newest first
+        return self._query(
+            "SELECT body FROM reports WHERE team_number = ? ORDER BY timestamp DESC",
+            (str(team_number),)
+        )
+
+    def event(self, event_key):
+        # All reports for an event, newest first
+        return self._query(
+            "SELECT body FROM reports WHERE event = ? ORDER BY timestamp DESC",
+            (event_key,)
+        )
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+    def _query(self, sql, params=()):
+        return [json.loads(row[0]) for row in self._connect().execute(sql, params)]
+
+    def _insert(self, conn, filename, report_data):
+        # Write one report row, filling in the fields the app relies on
+        report_data["filename"] = filename
+        if "team_number" not in report_data:
+            print(f"Warning: File {filename} missing required field 'team_number'")
+            report_data["team_number"] = filename.split('_')[0] if '_' in filename else "unknown"
+
+        conn.execute(
+            "INSERT OR REPLACE INTO reports (filename, team_number, event, match_number, timestamp, body) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                filename,
+                str(report_data.get("team_number")),
+                report_data.get("event"),
+                None if report_data.get("match_number") is None else str(report_data.get("match_number")),
+                str(report_data.get("timestamp", "")),
+                json.dumps(report_data)
+            )
+        )
+
+@click.command("migrate-reports")
+def migrate_reports_command():
+    # Import loose JSON reports into the SQLite report store
+    imported = sqlite_report_store.migrate_from_json()
+    click.echo(f"Imported {imported} reports into {sqlite_report_store.db_path}")
+
+sqlite_report_store = SQLiteReportStore()
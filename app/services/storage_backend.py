@@ -0,0 +1,254 @@
+import os
+import time
+import random
+import hashlib
+import datetime
+import threading
+import drive_integration
+from app.utils.metrics import timed_call
+
+class DriveBackend:
+    # Backup storage on Google Drive
+    #
+    # Thin wrapper over drive_integration, which keeps the shared clients and
+    # the file ID cache. Methods that raise are used by the sync, the others
+    # log and return None like the rest of the app expects.
+
+    name = "drive"
+
+    def list(self, folder_id=None, page_size=100, page_token=None, fields='nextPageToken, files(id, name)'):
+        # One page of the JSON files in a folder: {"files", "nextPageToken"}
+        return drive_integration.list_files_page(folder_id, page_size, page_token, fields)
+
+    def get(self, file_id):
+        # Raw bytes of a file, raising if it can't be read
+        return drive_integration.fetch_file_bytes(file_id)
+
+    def get_by_name(self, file_name, folder_id=None):
+        # Text of a file looked up by name, or None
+        return drive_integration.download_file_by_name(file_name, folder_id)
+
+    def put(self, file_content, file_name, folder_id=None, fields='id', mimetype='application/json'):
+        # Create or replace a file by name, raising on errors, returns its metadata
+        return drive_integration.put_file(file_content, file_name, folder_id, fields, mimetype)
+
+    def upload(self, file_content, file_name, folder_id=None, mimetype='application/json'):
+        # Create or replace a file by name, returns its ID or None
+        return drive_integration.upload_to_drive(file_content, file_name, folder_id, mimetype)
+
+    def find(self, file_name, folder_id=None):
+        # {"id", "name"} of a file looked up by name, or None
+        return drive_integration.find_file_by_name(file_name, folder_id)
+
+    def changes_start_token(self):
+        return drive_integration.get_changes_start_token()
+
+    def changes(self, page_token, page_size=1000):
+        # One page of the changes feed: {"changes", "nextPageToken", "newStartPageToken"}
+        return drive_integration.list_changes_page(page_token, page_size)
+
+    def is_not_found_error(self, error):
+        return drive_integration.is_not_found_error(error)
+
+    def is_rate_limit_error(self, error):
+        return drive_integration.is_rate_limit_error(error)
+
+    def is_retryable_error(self, error):
+        return drive_integration.is_retryable_error(error)
+
+class LocalDirectoryBackend:
+    # Drive stand-in that keeps "folders" as subdirectories of a local directory
+    #
+    # File IDs are "folder/name" paths and the metadata mirrors what Drive
+    # returns (md5Checksum, modifiedTime, parents), so the sync, the archive
+    # backup and the upload queue run unchanged against it. The changes feed
+    # is derived from file mtimes, so files copied in by hand show up too.
+    # Every call sleeps for the configured latency (plus up to 50% jitter) to
+    # make offline runs behave, and benchmark, more like the real thing.
+
+    name = "local"
+
+    def __init__(self, root, latency=0.0):
+        self.root = root
+        self.latency = latency
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency * random.uniform(1, 1.5))
+
+    def _folder(self, folder_id):
+        folder = folder_id or "root"
+        if os.path.basename(folder) != folder or folder.startswith('.'):
+            raise ValueError(f"Invalid folder ID: {folder_id}")
+        return folder
+
+    def _path(self, file_id):
+        folder, _, name = file_id.partition('/')
+        if not name or os.path.basename(name) != name or name.startswith('.'):
+            raise FileNotFoundError(f"No such file: {file_id}")
+        return os.path.join(self.root, self._folder(folder), name)
+
+    def _metadata(self, folder, name, data=None):
+        path = os.path.join(self.root, folder, name)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        modified = datetime.datetime.fromtimestamp(os.stat(path).st_mtime, datetime.timezone.utc)
+        return {
+            "id": f"{folder}/{name}",
+            "name": name,
+            "parents": [folder],
+            "mimeType": "application/json" if name.endswith('.json') else "application/octet-stream",
+            "trashed": False,
+            "md5Checksum": hashlib.md5(data).hexdigest(),
+            "modifiedTime": modified.isoformat().replace('+00:00', 'Z')
+        }
+
+    def list(self, folder_id=None, page_size=100, page_token=None, fields=None):
+        # Same paging contract as Drive, the page token is an offset into the sorted listing
+        self._simulate_latency()
+        folder = self._folder(folder_id)
+        directory = os.path.join(self.root, folder)
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json')) if os.path.isdir(directory) else []
+
+        offset = int(page_token or 0)
+        page = names[offset:offset + page_size]
+        return {
+            "files": [self._metadata(folder, name) for name in page],
+            "nextPageToken": str(offset + page_size) if offset + page_size < len(names) else None
+        }
+
+    def get(self, file_id):
+        self._simulate_latency()
+        with open(self._path(file_id), 'rb') as f:
+            return f.read()
+
+    def get_by_name(self, file_name, folder_id=None):
+        try:
+            return self.get(f"{self._folder(folder_id)}/{file_name}").decode('utf-8')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error reading {file_name} from local storage: {str(e)}")
+            return None
+
+    def put(self, file_content, file_name, folder_id=None, fields='id', mimetype='application/json'):
+        self._simulate_latency()
+        folder = self._folder(folder_id)
+        data = drive_integration.encode_content(file_content)
+        path = self._path(f"{folder}/{file_name}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write atomically so a concurrent reader never sees half a file
+        temp_path = os.path.join(os.path.dirname(path), f".{file_name}.{threading.get_ident()}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return self._metadata(folder, file_name, data)
+
+    def upload(self, file_content, file_name, folder_id=None, mimetype='application/json'):
+        try:
+            return self.put(file_content, file_name, folder_id, mimetype=mimetype)['id']
+        except (OSError, ValueError) as e:
+            print(f"Error writing {file_name} to local storage: {str(e)}")
+            return None
+
+    def find(self, file_name, folder_id=None):
+        self._simulate_latency()
+        try:
+            file_id = f"{self._folder(folder_id)}/{file_name}"
+            if os.path.isfile(self._path(file_id)):
+                return {"id": file_id, "name": file_name}
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def changes_start_token(self):
+        self._simulate_latency()
+        return str(time.time_ns())
+
+    def changes(self, page_token, page_size=1000):
+        # Files modified since the token's timestamp, across every folder
+        # Page tokens are "since:offset:scan_start"; deletions aren't reported
+        self._simulate_latency()
+        if ':' in page_token:
+            since, offset, scan_start = (int(part) for part in page_token.split(':'))
+        else:
+            since, offset, scan_start = int(page_token), 0, time.time_ns()
+
+        changed = []
+        for folder in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, folder)
+            if folder.startswith('.') or not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.startswith('.') and since < entry.stat().st_mtime_ns <= scan_start:
+                    changed.append((entry.stat().st_mtime_ns, folder, entry.name))
+        changed.sort()
+
+        page = changed[offset:offset + page_size]
+        more = offset + page_size < len(changed)
+        return {
+            "changes": [
+                {"fileId": f"{folder}/{name}", "removed": False, "file": self._metadata(folder, name)}
+                for _, folder, name in page
+            ],
+            "nextPageToken": f"{since}:{offset + page_size}:{scan_start}" if more else None,
+            "newStartPageToken": None if more else str(scan_start)
+        }
+
+    def is_not_found_error(self, error):
+        return isinstance(error, FileNotFoundError)
+
+    def is_rate_limit_error(self, error):
+        return False
+
+    def is_retryable_error(self, error):
+        return isinstance(error, OSError) and not isinstance(error, FileNotFoundError)
+
+class InstrumentedBackend:
+    # Records the count and latency of every storage call for /metrics
+    # Calls a backend makes internally (upload -> put) aren't counted twice
+
+    TIMED = ('list', 'get', 'get_by_name', 'put', 'upload', 'find', 'changes_start_token', 'changes')
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        method = getattr(self.backend, attr)
+        if attr not in self.TIMED:
+            return method
+
+        def timed(*args, **kwargs):
+            with timed_call(self.name, attr) as call:
+                result = method(*args, **kwargs)
+                # upload doesn't raise, it reports failure as None
+                if result is None and attr == 'upload':
+                    call.failed()
+                return result
+        return timed
+
+# The backend every Drive caller goes through, swapped by init_storage_backend
+_backend = InstrumentedBackend(DriveBackend())
+
+def init_storage_backend(app):
+    # Pick the backup storage backend from the config
+    global _backend
+    if app.config.get("STORAGE_BACKEND") == "local":
+        _backend = InstrumentedBackend(LocalDirectoryBackend(
+            app.config["STORAGE_LOCAL_DIR"],
+            latency=app.config.get("STORAGE_LOCAL_LATENCY_MS", 0) / 1000
+        ))
+        # Without a folder ID the app skips every backup, so give it one
+        if not app.config.get("GOOGLE_DRIVE_FOLDER_ID"):
+            app.config["GOOGLE_DRIVE_FOLDER_ID"] = "scouting"
+        print(f"Using local storage backend in {app.config['STORAGE_LOCAL_DIR']}")
+    else:
+        _backend = InstrumentedBackend(DriveBackend())
+
+def get_storage_backend():
+    return _backend
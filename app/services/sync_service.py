@@ -0,0 +1,521 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.services.storage_backend import get_storage_backend
+
+DRIVE_FILE_FIELDS = 'id, name, md5Checksum, modifiedTime'
+
+# Reports are saved as {team}_{YYYYmmdd_HHMMSS}.json, anything else in the
+# Drive folder (users.json, site_settings.json, ...) is not a report
+REPORT_FILENAME = re.compile(r'^[^_/\\]+_\d{8}_\d{6}\.json$')
+
+def is_report_filename(name):
+    return bool(REPORT_FILENAME.match(name))
+
+def count_local_reports(reports_dir):
+    # Reports in the directory, ignoring users.json, temp files and the like
+    if not os.path.isdir(reports_dir):
+        return 0
+    return sum(1 for name in os.listdir(reports_dir) if is_report_filename(name))
+
+class AdaptiveRateLimiter:
+    # Spaces out Drive requests shared by every sync thread
+    #
+    # Starts with no delay at all. When Drive answers 403/429 the gap between
+    # requests doubles, and every successful request shrinks it again, so the
+    # sync runs as fast as Drive allows instead of sleeping a fixed amount.
+
+    def __init__(self, min_interval=0.0, max_interval=30.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        # Block until this thread may send its next request
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def on_success(self):
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * 0.8 - 0.02)
+
+    def on_throttled(self):
+        with self._lock:
+            self.interval = min(self.max_interval, max(self.interval * 2, 0.5))
+            self._next_slot = time.monotonic() + self.interval
+
+class SyncManifest:
+    # What we last knew about every report on both sides of the sync
+    #
+    # For each report it records the local content hash (with the mtime and
+    # size it was computed from, so unchanged files are never re-read), Drive's
+    # file ID, md5Checksum and modifiedTime, and the hash both sides agreed on
+    # after the last successful transfer. Comparing those is enough to work out
+    # uploads, downloads and conflicts without downloading any file bodies.
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error loading sync manifest, starting fresh: {str(e)}")
+                self.entries = {}
+        return self
+
+    def save(self):
+        # Write atomically so a crash never leaves a half-written manifest
+        with self._lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(temp_path, self.path)
+
+    def update(self, name, **fields):
+        with self._lock:
+            self.entries.setdefault(name, {}).update(fields)
+
+    def set_remote(self, name, file):
+        # Record Drive's metadata for a report
+        # A new version on Drive gets a fresh set of transfer attempts
+        with self._lock:
+            entry = self.entries.get(name, {})
+            if entry.get('drive_md5') != file.get('md5Checksum'):
+                entry.pop('attempts', None)
+        self.update(name, drive_id=file['id'], drive_md5=file.get('md5Checksum'), drive_modified=file.get('modifiedTime'))
+
+    def clear_remote(self, name):
+        self.update(name, drive_id=None, drive_md5=None, drive_modified=None)
+
+    def name_for_drive_id(self, file_id):
+        with self._lock:
+            for name, entry in self.entries.items():
+                if entry.get('drive_id') == file_id:
+                    return name
+        return None
+
+    def scan_local(self, reports_dir):
+        # Bring the local hashes up to date, only re-reading files whose mtime or size changed
+        seen = set()
+        with os.scandir(reports_dir) as files:
+            for file in files:
+                if not is_report_filename(file.name):
+                    continue
+                seen.add(file.name)
+
+                stat = file.stat()
+                entry = self.entries.get(file.name, {})
+                if entry.get('local_mtime') == stat.st_mtime and entry.get('local_size') == stat.st_size:
+                    continue
+
+                with open(file.path, 'rb') as f:
+                    local_md5 = hashlib.md5(f.read()).hexdigest()
+                if entry.get('local_md5') != local_md5:
+                    with self._lock:
+                        entry.pop('attempts', None)
+                self.update(file.name, local_md5=local_md5, local_mtime=stat.st_mtime, local_size=stat.st_size)
+
+        for name, entry in self.entries.items():
+            if name not in seen and entry.get('local_md5'):
+                self.update(name, local_md5=None, local_mtime=None, local_size=None)
+
+    def record_attempt(self, name, ok):
+        # Count failed transfers of a report, a success resets the count
+        with self._lock:
+            entry = self.entries.setdefault(name, {})
+            if ok:
+                entry.pop('attempts', None)
+            else:
+                entry['attempts'] = entry.get('attempts', 0) + 1
+
+    def reconcile(self, max_attempts=None):
+        # Work out what has to move in which direction
+        # Reports that failed max_attempts transfers in a row are left alone
+        # until either side changes
+        uploads, downloads, conflicts = [], [], []
+
+        for name, entry in self.entries.items():
+            if max_attempts and entry.get('attempts', 0) >= max_attempts:
+                continue
+            local_md5 = entry.get('local_md5')
+            drive_md5 = entry.get('drive_md5')
+            synced_md5 = entry.get('synced_md5')
+
+            if local_md5 and not entry.get('drive_id'):
+                uploads.append(name)
+            elif entry.get('drive_id') and not local_md5:
+                downloads.append(name)
+            elif not local_md5 or local_md5 == drive_md5:
+                if local_md5 and synced_md5 != local_md5:
+                    self.update(name, synced_md5=local_md5)
+            else:
+                local_changed = local_md5 != synced_md5
+                remote_changed = drive_md5 != synced_md5
+                if local_changed and remote_changed:
+                    conflicts.append(name)
+                elif local_changed:
+                    uploads.append(name)
+                else:
+                    downloads.append(name)
+
+        return uploads, downloads, conflicts
+
+class SyncCheckpoint:
+    # On-disk progress of the sync currently in flight
+    #
+    # Holds the changes token the sync started from, how far the listing got
+    # (its page token), the transfer plan, and which transfers completed or
+    # failed. A sync that crashed or was restarted picks up from here instead
+    # of starting over.
+
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error loading sync checkpoint, starting over: {str(e)}")
+                self.data = None
+        return self.data
+
+    def start(self, mode, token):
+        self.data = {
+            "run_id": str(time.time()),
+            "mode": mode,
+            "token": token,
+            "new_token": None,
+            "phase": "listing",
+            "page_token": None,
+            "uploads": [],
+            "downloads": [],
+            "completed": [],
+            "failed": []
+        }
+        return self.data
+
+    def mark(self, name, ok):
+        # Record the outcome of one transfer
+        with self._lock:
+            if ok:
+                self.data["completed"].append(name)
+                if name in self.data["failed"]:
+                    self.data["failed"].remove(name)
+            elif name not in self.data["failed"]:
+                self.data["failed"].append(name)
+
+    def save(self):
+        # Write atomically so a crash never leaves a half-written checkpoint
+        with self._lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(temp_path, self.path)
+
+    def clear(self):
+        self.data = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class ReportSyncer:
+    # Two-way sync between the reports directory and the Drive folder
+    #
+    # Drive's side of the manifest is refreshed from a full folder listing the
+    # first time and from the Drive changes feed after that (the feed token is
+    # saved next to last_sync.txt). The local side comes from a stat scan of the
+    # reports directory. Reconciling the two gives the uploads, downloads and
+    # conflicts in one pass, and the transfers run in a bounded thread pool with
+    # rate limits and server errors retried through the AdaptiveRateLimiter.
+    #
+    # Progress is checkpointed after every listing page and every few transfers,
+    # so an interrupted sync resumes where it stopped.
+
+    CHECKPOINT_EVERY = 25
+    # Failed transfers of a report before it's skipped until it changes
+    MAX_TRANSFER_ATTEMPTS = 5
+
+    def __init__(self, reports_dir, folder_id, store, token_path, manifest_path, checkpoint_path,
+                 workers=8, page_size=1000, max_retries=5, backend=None):
+        self.backend = backend or get_storage_backend()
+        self.reports_dir = reports_dir
+        self.folder_id = folder_id
+        self.store = store
+        self.token_path = token_path
+        self.manifest = SyncManifest(manifest_path)
+        self.checkpoint = SyncCheckpoint(checkpoint_path)
+        self.workers = workers
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.limiter = AdaptiveRateLimiter()
+        self._stats_lock = threading.Lock()
+        self._since_checkpoint = 0
+        self.stats = {
+            "mode": "full",
+            "resumed": False,
+            "synced": 0,
+            "uploaded": 0,
+            "failed": 0,
+            "skipped": 0,
+            "conflicts": [],
+            "total_drive": 0,
+            "batches": 0,
+            "bytes_downloaded": 0,
+            "bytes_uploaded": 0,
+            "retries": 0,
+            "throttled": 0
+        }
+
+    def run(self):
+        # Finish any interrupted sync first, then run a normal one
+        started = time.monotonic()
+        self.stats["local_before"] = count_local_reports(self.reports_dir)
+        self.manifest.load()
+
+        if self.checkpoint.load():
+            self.stats["resumed"] = True
+            print(f"Resuming interrupted sync from the {self.checkpoint.data['phase']} phase")
+            self._run_pass()
+        self._run_pass()
+
+        self.stats["elapsed_seconds"] = round(time.monotonic() - started, 2)
+        return self.stats
+
+    def _run_pass(self):
+        # One listing + reconcile + transfer pass, returns True if it finished cleanly
+        checkpoint = self.checkpoint.data
+        if checkpoint is None:
+            token = self._load_token()
+            checkpoint = self.checkpoint.start("delta" if token else "full", token)
+            if not token:
+                # Taken before the listing so nothing changed during it is missed
+                checkpoint["new_token"] = self._call(self.backend.changes_start_token)
+            self._save_progress()
+
+        self.stats["mode"] = checkpoint["mode"]
+
+        if checkpoint["phase"] == "listing":
+            if checkpoint["mode"] == "delta":
+                self._refresh_from_changes()
+            else:
+                self._refresh_from_listing()
+
+            self.manifest.scan_local(self.reports_dir)
+            uploads, downloads, conflicts = self.manifest.reconcile(self.MAX_TRANSFER_ATTEMPTS)
+            self.stats["conflicts"] = sorted(conflicts)
+            checkpoint.update(phase="transfer", uploads=uploads, downloads=downloads)
+            self._save_progress()
+            print(f"Sync plan: {len(uploads)} uploads, {len(downloads)} downloads, {len(conflicts)} conflicts")
+
+        # Anything already transferred by an earlier attempt is skipped,
+        # so a resumed sync only retries what failed or never ran
+        completed = set(checkpoint["completed"])
+        downloads = [name for name in checkpoint["downloads"] if name not in completed]
+        uploads = [name for name in checkpoint["uploads"] if name not in completed]
+        self.stats["skipped"] += len(checkpoint["downloads"]) + len(checkpoint["uploads"]) - len(downloads) - len(uploads)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(self._download, name) for name in downloads]
+                futures += [pool.submit(self._upload, name) for name in uploads]
+                for future in futures:
+                    future.result()
+        finally:
+            self._save_progress()
+
+        # Failed transfers stay pending in the manifest, so the next reconcile
+        # plans them again (up to MAX_TRANSFER_ATTEMPTS) and the token can move
+        # forward without losing them
+        if checkpoint["new_token"]:
+            self._save_token(checkpoint["new_token"])
+        clean = not checkpoint["failed"]
+        self.checkpoint.clear()
+        return clean
+
+    def _refresh_from_listing(self):
+        # Rebuild Drive's side of the manifest from a full folder listing
+        checkpoint = self.checkpoint.data
+        while True:
+            self.stats["batches"] += 1
+            print(f"Fetching file list page #{self.stats['batches']} from {self.backend.name} storage")
+
+            result = self._call(self.backend.list, self.folder_id, self.page_size, checkpoint["page_token"],
+                                f'nextPageToken, files({DRIVE_FILE_FIELDS})')
+
+            for file in result["files"]:
+                if is_report_filename(file['name']):
+                    self.manifest.set_remote(file['name'], file)
+                    self.manifest.update(file['name'], listed=checkpoint["run_id"])
+            self.stats["total_drive"] += len(result["files"])
+
+            checkpoint["page_token"] = result["nextPageToken"]
+            self._save_progress()
+            if not checkpoint["page_token"]:
+                break
+
+        # Reports we thought were on Drive but weren't in this listing
+        for name, entry in list(self.manifest.entries.items()):
+            if entry.get('drive_id') and entry.get('listed') != checkpoint["run_id"]:
+                self.manifest.clear_remote(name)
+
+    def _refresh_from_changes(self):
+        # Apply the Drive changes since the token to Drive's side of the manifest
+        checkpoint = self.checkpoint.data
+        page_token = checkpoint["page_token"] or checkpoint["token"]
+        while True:
+            self.stats["batches"] += 1
+            result = self._call(self.backend.changes, page_token, self.page_size)
+
+            for change in result["changes"]:
+                file = change.get('file')
+                if change.get('removed') or not file or file.get('trashed'):
+                    name = self.manifest.name_for_drive_id(change.get('fileId'))
+                    if name:
+                        self.manifest.clear_remote(name)
+                    continue
+                if self.folder_id and self.folder_id not in file.get('parents', []):
+                    continue
+                if not is_report_filename(file['name']):
+                    continue
+
+                self.stats["total_drive"] += 1
+                self.manifest.set_remote(file['name'], file)
+
+            if result["nextPageToken"]:
+                page_token = checkpoint["page_token"] = result["nextPageToken"]
+                self._save_progress()
+            else:
+                checkpoint["new_token"] = result["newStartPageToken"]
+                return
+
+    def _save_progress(self):
+        # Persist the manifest and then the checkpoint that refers to it
+        self.manifest.save()
+        self.checkpoint.save()
+        self._since_checkpoint = 0
+
+    def _transfer_done(self, name, ok):
+        # Record a finished transfer, checkpointing every few of them
+        self.checkpoint.mark(name, ok)
+        self.manifest.record_attempt(name, ok)
+        with self._stats_lock:
+            self._since_checkpoint += 1
+            due = self._since_checkpoint >= self.CHECKPOINT_EVERY
+        if due:
+            self._save_progress()
+
+    def _load_token(self):
+        if not os.path.exists(self.token_path):
+            return None
+        with open(self.token_path, 'r') as f:
+            return f.read().strip() or None
+
+    def _save_token(self, token):
+        with open(self.token_path, 'w') as f:
+            f.write(token)
+
+    def throughput(self):
+        # Throughput summary for the sync status page
+        elapsed = self.stats.get("elapsed_seconds") or 0
+        return {
+            "files_per_second": round((self.stats["synced"] + self.stats["uploaded"]) / elapsed, 2) if elapsed else 0,
+            "bytes_downloaded": self.stats["bytes_downloaded"],
+            "bytes_uploaded": self.stats["bytes_uploaded"],
+            "retries": self.stats["retries"],
+            "throttled": self.stats["throttled"],
+            "elapsed_seconds": elapsed,
+            "workers": self.workers
+        }
+
+    def _download(self, name):
+        # Download one report and write it into the reports directory
+        try:
+            content = self._call(self.backend.get, self.manifest.entries[name]['drive_id'])
+            local_path = os.path.join(self.reports_dir, name)
+            with open(local_path, 'wb') as f:
+                f.write(content)
+            self.store.add(name)
+
+            stat = os.stat(local_path)
+            content_md5 = hashlib.md5(content).hexdigest()
+            self.manifest.update(name, local_md5=content_md5, local_mtime=stat.st_mtime,
+                                 local_size=stat.st_size, synced_md5=content_md5)
+
+            with self._stats_lock:
+                self.stats["synced"] += 1
+                self.stats["bytes_downloaded"] += len(content)
+            self._transfer_done(name, True)
+        except Exception as e:
+            if self.backend.is_not_found_error(e):
+                # Deleted or trashed on Drive since it was listed, nothing left to fetch
+                print(f"{name} is gone from {self.backend.name} storage, skipping it")
+                self.manifest.clear_remote(name)
+                self._transfer_done(name, True)
+                return
+            print(f"Error downloading {name}: {str(e)}")
+            with self._stats_lock:
+                self.stats["failed"] += 1
+            self._transfer_done(name, False)
+
+    def _upload(self, name):
+        # Push one local report to Drive
+        try:
+            with open(os.path.join(self.reports_dir, name), 'rb') as f:
+                content = f.read()
+
+            file = self._call(self.backend.put, content, name, self.folder_id, DRIVE_FILE_FIELDS)
+            self.manifest.set_remote(name, file)
+            self.manifest.update(name, synced_md5=hashlib.md5(content).hexdigest())
+
+            with self._stats_lock:
+                self.stats["uploaded"] += 1
+                self.stats["bytes_uploaded"] += len(content)
+            self._transfer_done(name, True)
+        except Exception as e:
+            print(f"Error uploading {name}: {str(e)}")
+            with self._stats_lock:
+                self.stats["failed"] += 1
+            self._transfer_done(name, False)
+
+    def _call(self, function, *args):
+        # Call the storage backend through the rate limiter, retrying with backoff
+        attempt = 0
+        while True:
+            self.limiter.wait()
+            try:
+                result = function(*args)
+                self.limiter.on_success()
+                return result
+            except Exception as e:
+                if attempt >= self.max_retries or not self.backend.is_retryable_error(e):
+                    raise
+
+                attempt += 1
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+
+                if self.backend.is_rate_limit_error(e):
+                    with self._stats_lock:
+                        self.stats["throttled"] += 1
+                    self.limiter.on_throttled()
+                else:
+                    time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1))
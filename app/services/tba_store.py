@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class TBAResponseStore:
+    # Persistent store for TBA API responses
+    #
+    # One row per endpoint with the raw JSON body, its ETag / Last-Modified,
+    # when it was last fetched or revalidated and how long it stays fresh.
+    # The database runs in WAL mode, so every gunicorn worker reads the same
+    # responses, and they survive restarts and deploys: the first page views
+    # after a redeploy are served from here instead of fanning out to TBA.
+    # A revalidation that comes back 304 only updates fetched_at.
+    #
+    # A small lease table lets one worker at a time fetch a given endpoint,
+    # the others wait for its result to show up in the responses table. A
+    # failed fetch is written to the failures table instead, so the waiters
+    # (and anyone asking shortly after) get the error rather than retrying.
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS responses (
+            endpoint TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            ttl INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_responses_fetched ON responses (fetched_at)",
+        """CREATE TABLE IF NOT EXISTS leases (
+            endpoint TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS failures (
+            endpoint TEXT PRIMARY KEY,
+            error TEXT NOT NULL,
+            failed_at REAL NOT NULL
+        )"""
+    ]
+
+    # Responses nobody has asked for in this long (seconds) are dropped at startup
+    RETENTION_SECONDS = 7 * 86400
+
+    def __init__(self):
+        self.db_path = None
+        self._pid = None
+        self._local = threading.local()
+
+    def init_app(self, app):
+        self.db_path = app.config["TBA_CACHE_DB"]
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.execute("DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.RETENTION_SECONDS,))
+            conn.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+            conn.execute("DELETE FROM failures")
+
+    def _connect(self):
+        # One connection per thread, and new ones after a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, endpoint):
+        # The stored response for an endpoint with its body parsed, or None
+        if not self.db_path:
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT body, etag, last_modified, fetched_at, ttl FROM responses WHERE endpoint = ?", (endpoint,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading TBA response for {endpoint}: {str(e)}")
+            return None
+        if row is None:
+            return None
+
+        body, etag, last_modified, fetched_at, ttl = row
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            return None
+        return {"data": data, "etag": etag, "last_modified": last_modified, "fetched_at": fetched_at, "ttl": ttl}
+
+    def fetched_at(self, endpoint):
+        # When the stored response was last fetched or revalidated, without loading its body
+        if not self.db_path:
+            return None
+        row = self._connect().execute("SELECT fetched_at FROM responses WHERE endpoint = ?", (endpoint,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, endpoint, body, etag=None, last_modified=None, ttl=3600, fetched_at=None):
+        # Store a full response, body is the JSON text as TBA sent it
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    """INSERT OR REPLACE INTO responses (endpoint, body, etag, last_modified, fetched_at, ttl, size)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (endpoint, body, etag, last_modified, fetched_at or time.time(), ttl, len(body))
+                )
+                conn.execute("DELETE FROM failures WHERE endpoint = ?", (endpoint,))
+        except sqlite3.Error as e:
+            print(f"Error storing TBA response for {endpoint}: {str(e)}")
+
+    def touch(self, endpoint, etag=None, fetched_at=None):
+        # Mark a stored response as confirmed unchanged (a 304)
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE responses SET fetched_at = ?, etag = COALESCE(?, etag) WHERE endpoint = ?",
+                    (fetched_at or time.time(), etag, endpoint)
+                )
+                conn.execute("DELETE FROM failures WHERE endpoint = ?", (endpoint,))
+        except sqlite3.Error as e:
+            print(f"Error updating TBA response for {endpoint}: {str(e)}")
+
+    def record_failure(self, endpoint, error, failed_at=None):
+        # Remember that fetching an endpoint just failed
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO failures (endpoint, error, failed_at) VALUES (?, ?, ?)",
+                    (endpoint, error, failed_at or time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"Error recording TBA failure for {endpoint}: {str(e)}")
+
+    def recent_failure(self, endpoint, seconds):
+        # The error from a fetch of an endpoint that failed in the last few seconds, or None
+        if not self.db_path or seconds <= 0:
+            return None
+        try:
+            row = self._connect().execute(
+                "SELECT error FROM failures WHERE endpoint = ? AND failed_at > ?", (endpoint, time.time() - seconds)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading TBA failure for {endpoint}: {str(e)}")
+            return None
+        return row[0] if row else None
+
+    def acquire_lease(self, endpoint, owner, seconds):
+        # Try to become the one worker fetching an endpoint, True if we got it
+        # An expired lease (its holder died or hung) can be taken over
+        if not self.db_path:
+            return True
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    """INSERT INTO leases (endpoint, owner, expires) VALUES (?, ?, ?)
+                       ON CONFLICT (endpoint) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+                       WHERE leases.expires < ?""",
+                    (endpoint, owner, now + seconds, now)
+                )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            # Better to fetch twice than not at all
+            print(f"Error taking TBA lease for {endpoint}: {str(e)}")
+            return True
+
+    def release_lease(self, endpoint, owner):
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM leases WHERE endpoint = ? AND owner = ?", (endpoint, owner))
+        except sqlite3.Error as e:
+            print(f"Error releasing TBA lease for {endpoint}: {str(e)}")
+
+    def delete(self, endpoint):
+        if not self.db_path:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+
+    def clear(self):
+        if not self.db_path:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM failures")
+
+    def entries(self, prefix=None):
+        # Every stored response without its body, most recently fetched first
+        if not self.db_path:
+            return []
+        sql = "SELECT endpoint, etag, last_modified, fetched_at, ttl, size FROM responses"
+        params = ()
+        if prefix:
+            sql += " WHERE substr(endpoint, 1, ?) = ?"
+            params = (len(prefix), prefix)
+        now = time.time()
+        return [
+            {
+                "endpoint": endpoint,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": fetched_at,
+                "ttl": ttl,
+                "size": size,
+                "age": int(now - fetched_at),
+                "fresh": now - fetched_at < ttl
+            }
+            for endpoint, etag, last_modified, fetched_at, ttl, size in self._connect().execute(
+                sql + " ORDER BY fetched_at DESC", params
+            )
+        ]
+
+    def stats(self):
+        # Number of stored responses and their total size
+        if not self.db_path:
+            return {"count": 0, "bytes": 0}
+        count, total = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        return {"count": count, "bytes": total}
+
+tba_response_store = TBAResponseStore()
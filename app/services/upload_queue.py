@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from app.services.storage_backend import get_storage_backend
+
+class DriveUploadQueue:
+    # Durable write-behind queue for Google Drive uploads
+    #
+    # Requests only record the upload in a small SQLite database and return.
+    # A background worker drains the queue in batches and retries failures
+    # with exponential backoff. Every gunicorn worker runs a drain thread;
+    # rows are leased before they are uploaded, so only one of them picks up
+    # a given file. Queueing a file that is already waiting just replaces its
+    # content, so a burst of saves to the same file becomes one upload.
+    # Entries can also point at a local file (source_path) that is read when
+    # the upload runs, so the latest version of a growing file is what goes up.
+    # A registered preparer can build that content instead, e.g. to merge in
+    # what Drive already has before it's overwritten.
+
+    SCHEMA = """CREATE TABLE IF NOT EXISTS uploads (
+        name TEXT NOT NULL,
+        folder_id TEXT NOT NULL,
+        content TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 1,
+        enqueued_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        leased_until REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        source_path TEXT,
+        mimetype TEXT NOT NULL DEFAULT 'application/json',
+        PRIMARY KEY (name, folder_id)
+    )"""
+
+    def __init__(self):
+        self.db_path = None
+        self.batch_size = 10
+        self.poll_interval = 5
+        self.lease_seconds = 120
+        self.base_backoff = 5
+        self.max_backoff = 900
+        self._pid = None
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._fork_hook = False
+        self._preparers = {}  # matches(name) -> prepare(name, folder_id, source_path) returning the content
+
+    def init_app(self, app):
+        self.db_path = app.config["UPLOAD_QUEUE_DB"]
+        self.batch_size = app.config.get("UPLOAD_QUEUE_BATCH_SIZE", self.batch_size)
+        self.poll_interval = app.config.get("UPLOAD_QUEUE_POLL_INTERVAL", self.poll_interval)
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.execute(self.SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_ready ON uploads (next_attempt)")
+
+            # Queues created before source_path/mimetype existed
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(uploads)")}
+            if "source_path" not in columns:
+                conn.execute("ALTER TABLE uploads ADD COLUMN source_path TEXT")
+            if "mimetype" not in columns:
+                conn.execute("ALTER TABLE uploads ADD COLUMN mimetype TEXT NOT NULL DEFAULT 'application/json'")
+
+        self._start_drain_thread()
+        # Workers forked from a preloaded app don't inherit the thread
+        if not self._fork_hook and hasattr(os, "register_at_fork"):
+            self._fork_hook = True
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_drain_thread(self):
+        # Only one drain thread per process, even if the app is created twice
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="drive-upload-queue")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _after_fork(self):
+        # The parent's event may have been mid-use by its drain thread
+        self._wakeup = threading.Event()
+        self._start_drain_thread()
+
+    def _connect(self):
+        # One connection per thread, sqlite3 connections can't be shared
+        # Workers forked from a preloaded app get their own connections
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def register_preparer(self, matches, prepare):
+        # Have prepare build the content of queued files whose name matches
+        # It runs right before the upload, if it raises the upload is retried later
+        self._preparers[matches] = prepare
+
+    def _read_source(self, name, folder_id, source_path):
+        for matches, prepare in self._preparers.items():
+            if matches(name):
+                return prepare(name, folder_id or None, source_path)
+        with open(source_path, 'rb') as f:
+            return f.read()
+
+    def enqueue(self, file_name, file_content=None, folder_id=None, source_path=None, mimetype='application/json'):
+        # Queue a file to be uploaded to Drive in the background
+        # Pass either the content itself or a source_path to read at upload time
+        if isinstance(file_content, (dict, list)):
+            file_content = json.dumps(file_content, indent=2)
+        if file_content is None:
+            file_content = ""
+
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """INSERT INTO uploads (name, folder_id, content, enqueued_at, next_attempt, source_path, mimetype)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name, folder_id) DO UPDATE SET
+                    content = excluded.content,
+                    source_path = excluded.source_path,
+                    mimetype = excluded.mimetype,
+                    version = version + 1,
+                    attempts = 0,
+                    next_attempt = excluded.next_attempt""",
+                (file_name, folder_id or "", str(file_content), now, now, source_path, mimetype)
+            )
+
+        self._wakeup.set()
+
+    def is_pending(self, file_name, folder_id=None):
+        # True if a newer version of the file is still waiting to be uploaded
+        if not self.db_path:
+            return False
+        return self._connect().execute(
+            "SELECT 1 FROM uploads WHERE name = ? AND folder_id = ?", (file_name, folder_id or "")
+        ).fetchone() is not None
+
+    def stats(self):
+        # Queue depth and age of the oldest waiting upload, for the admin dashboard
+        if not self.db_path:
+            return {"depth": 0, "oldest_age": None, "retrying": 0}
+
+        depth, oldest, retrying = self._connect().execute(
+            "SELECT COUNT(*), MIN(enqueued_at), SUM(attempts > 0) FROM uploads"
+        ).fetchone()
+
+        return {
+            "depth": depth,
+            "oldest_age": round(time.time() - oldest) if oldest else None,
+            "retrying": retrying or 0
+        }
+
+    def drain(self):
+        # Upload one batch of ready files, returns how many were uploaded
+        batch = self._lease_batch()
+        uploaded = 0
+
+        for name, folder_id, content, version, attempts, source_path, mimetype in batch:
+            file_id = None
+            error = None
+            try:
+                if source_path:
+                    if not os.path.exists(source_path):
+                        print(f"Dropping queued Drive upload of {name}, {source_path} no longer exists")
+                        self._complete(name, folder_id, version)
+                        continue
+                    content = self._read_source(name, folder_id, source_path)
+                file_id = get_storage_backend().upload(content, name, folder_id or None, mimetype)
+            except Exception as e:
+                error = str(e)
+
+            if file_id:
+                self._complete(name, folder_id, version)
+                uploaded += 1
+            else:
+                self._retry(name, folder_id, attempts, error or "Upload returned no file ID")
+
+        return uploaded
+
+    def _lease_batch(self):
+        # Claim up to batch_size ready rows so no other worker uploads them
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """SELECT name, folder_id, content, version, attempts, source_path, mimetype FROM uploads
+                WHERE next_attempt <= ? AND leased_until <= ?
+                ORDER BY enqueued_at LIMIT ?""",
+                (now, now, self.batch_size)
+            ).fetchall()
+
+            for name, folder_id, *_ in rows:
+                conn.execute(
+                    "UPDATE uploads SET leased_until = ? WHERE name = ? AND folder_id = ?",
+                    (now + self.lease_seconds, name, folder_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return rows
+
+    def _complete(self, name, folder_id, version):
+        # Remove an uploaded row unless it was re-queued with newer content meanwhile
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM uploads WHERE name = ? AND folder_id = ? AND version = ?",
+                (name, folder_id, version)
+            ).rowcount
+
+            if not deleted:
+                conn.execute(
+                    "UPDATE uploads SET leased_until = 0 WHERE name = ? AND folder_id = ?",
+                    (name, folder_id)
+                )
+
+    def _retry(self, name, folder_id, attempts, error):
+        # Schedule another attempt with exponential backoff and jitter
+        delay = min(self.base_backoff * (2 ** attempts), self.max_backoff)
+        delay += random.uniform(0, delay / 2)
+        print(f"Drive upload of {name} failed (attempt {attempts + 1}), retrying in {delay:.0f}s: {error}")
+
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """UPDATE uploads SET attempts = attempts + 1, next_attempt = ?,
+                leased_until = 0, last_error = ? WHERE name = ? AND folder_id = ?""",
+                (time.time() + delay, error, name, folder_id)
+            )
+
+    def _run(self):
+        # Background worker loop
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            try:
+                # Keep going while full batches are coming back
+                while self.drain() >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Error draining Drive upload queue: {str(e)}")
+
+upload_queue = DriveUploadQueue()
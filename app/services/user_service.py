@@ -4,9 +4,9 @@ import datetime
 import hashlib
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import current_app
-# Use the correct drive_integration import
-from drive_integration import upload_to_drive, download_file_from_drive, find_file_by_name
+from app.services.storage_backend import get_storage_backend
 from app.utils.logger import log_activity
+from app.utils.invalidation import invalidation_bus
 
 class UserManager:
     # User management service
@@ -29,6 +29,12 @@ class UserManager:
         
         # Now load users (includes the just-downloaded file)
         self.users = self._load_users()
+        
+        # Reload when another worker changes a user
+        invalidation_bus.subscribe("users", self._reload_users)
+    
+    def _reload_users(self, key=None):
+        self.users = self._load_users()
     
     def _force_download_from_drive(self):
         # Force download the users.json file from Google Drive at startup
@@ -37,16 +43,10 @@ class UserManager:
             return False
         
         try:
-            # Find users file in Drive
-            file_info = find_file_by_name("users.json", self.google_drive_folder_id)
-            if not file_info:
-                print("No users.json found on Google Drive. Using local file only.")
-                return False
-            
-            # Download users file
-            content = download_file_from_drive(file_info['id'])
+            # Download users file (the file ID is usually cached, so this is one request)
+            content = get_storage_backend().get_by_name("users.json", self.google_drive_folder_id)
             if not content:
-                print("Failed to download users.json from Google Drive.")
+                print("No users.json downloaded from Google Drive. Using local file only.")
                 return False
             
             # Parse and save locally
@@ -84,6 +84,7 @@ class UserManager:
         # Save users locally and to Google Drive
         # Save users locally
         self._save_local_users(self.users)
+        invalidation_bus.publish("users")
         
         # Backup to Google Drive if configured
         if self.google_drive_folder_id:
@@ -102,7 +103,7 @@ class UserManager:
     def _save_drive_users(self, users_data):
         # Save users to Google Drive
         try:
-            result = upload_to_drive(users_data, "users.json", self.google_drive_folder_id)
+            result = get_storage_backend().upload(users_data, "users.json", self.google_drive_folder_id)
             if result:
                 print(f"User data uploaded to Drive with ID: {result}")
                 return True
@@ -1,9 +1,18 @@
+import os
 import threading
 import time
 import datetime
 from flask import current_app, copy_current_request_context
+from app.utils.invalidation import invalidation_bus
 
 class BackgroundTaskManager:
+    # Runs long jobs (like the Drive sync) in background threads
+    #
+    # Task status is also written to the invalidation bus's shared state, so
+    # every gunicorn worker sees the same status page and a task started in
+    # one worker can't be started again in another while it runs. Every
+    # record carries updated_at, whichever copy is newer wins.
+    
     def __init__(self):
         self.tasks = {}
         self._lock = threading.Lock()
@@ -22,9 +31,22 @@ class BackgroundTaskManager:
                 'status': 'running',
                 'start_time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 'result': None,
-                'error': None
+                'error': None,
+                'worker_pid': os.getpid(),
+                'updated_at': time.time()
             }
             
+            # Claimed in one transaction, so two workers can't both start it
+            def can_claim(shared):
+                return not (shared and shared['status'] == 'running' and self._worker_alive(shared.get('worker_pid')))
+            try:
+                claimed = invalidation_bus.claim_state(f"task:{task_name}", task_info, can_claim)
+            except Exception as e:
+                print(f"Error claiming task {task_name}: {str(e)}")
+                claimed = True
+            if not claimed:
+                return {'status': 'already_running', 'task_id': task_name}
+            
             self.tasks[task_name] = task_info
             
             # Get current application for context
@@ -49,22 +71,62 @@ class BackgroundTaskManager:
                     self.tasks[task_name]['status'] = 'completed'
                     self.tasks[task_name]['result'] = result
                     self.tasks[task_name]['end_time'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    self._publish(task_name)
             except Exception as e:
                 with self._lock:
                     self.tasks[task_name]['status'] = 'failed'
                     self.tasks[task_name]['error'] = str(e)
                     self.tasks[task_name]['end_time'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    self._publish(task_name)
+    
+    def _publish(self, task_name):
+        # Share a task's status with the other workers
+        self.tasks[task_name]['updated_at'] = time.time()
+        try:
+            invalidation_bus.set_state(f"task:{task_name}", self.tasks[task_name])
+        except Exception as e:
+            print(f"Error sharing status of task {task_name}: {str(e)}")
+    
+    @staticmethod
+    def _worker_alive(pid):
+        # A task marked running by a worker that has since died is not running
+        if not pid:
+            return False
+        try:
+            os.kill(pid, 0)
+            return True
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+    
+    def _current(self, local, shared):
+        # The newer of this worker's record of a task and the shared one
+        if local is None:
+            record = shared
+        elif shared is None:
+            record = local
+        else:
+            record = shared if shared.get('updated_at', 0) > local.get('updated_at', 0) else local
+        
+        # Started by another worker that has since died
+        if record and record['status'] == 'running' and not self._worker_alive(record.get('worker_pid')):
+            record = dict(record, status='failed', error='The worker running this task stopped')
+        return record
     
     def get_task_status(self, task_name):
-        # Get the status of a task
+        # Get the status of a task, wherever it was run
+        shared = invalidation_bus.get_state(f"task:{task_name}")
         with self._lock:
-            if task_name not in self.tasks:
-                return {'status': 'not_found'}
-            return self.tasks[task_name]
+            local = self.tasks.get(task_name)
+            record = self._current(dict(local) if local else None, shared)
+        return record or {'status': 'not_found'}
     
     def get_all_tasks(self):
-        # Get all tasks and their statuses
+        # Get all tasks and their statuses, including ones run by other workers
+        tasks = invalidation_bus.get_states("task:")
         with self._lock:
-            return self.tasks.copy()
+            local = {name: dict(info) for name, info in self.tasks.items()}
+        return {name: self._current(local.get(name), tasks.get(name)) for name in set(tasks) | set(local)}
 
 task_manager = BackgroundTaskManager()
\ No newline at end of file
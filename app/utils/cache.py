@@ -1,15 +1,30 @@
 from flask_caching import Cache
-from app.utils.cache_tracker import update_cache_info, record_cache_hit
+from flask_caching.backends import SimpleCache
+from app.utils.cache_tracker import (update_cache_info, record_cache_hit, record_cache_miss, cache_namespace,
+                                     start_cache_stats_flusher)
+from app.utils.invalidation import invalidation_bus
+from app.services.tba_store import tba_response_store
 import functools
+import threading
 
 # Initialize cache
 cache = Cache()
 
+# Short names for the CACHE_TYPE setting
+CACHE_BACKENDS = {
+    'simple': 'flask_caching.backends.SimpleCache',          # per worker, in memory
+    'filesystem': 'flask_caching.backends.FileSystemCache',  # shared, one file per entry
+    'sqlite': 'app.utils.sqlite_cache.SQLiteCache'            # shared, one database file
+}
+
 def init_cache(app):
+    cache_type = app.config.get('CACHE_TYPE', 'sqlite')
     cache_config = {
-        'CACHE_TYPE': 'simple',
-        'CACHE_DEFAULT_TIMEOUT': 300
+        'CACHE_TYPE': CACHE_BACKENDS.get(cache_type, cache_type),
+        'CACHE_DEFAULT_TIMEOUT': app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
     }
+    if cache_type == 'filesystem':
+        cache_config['CACHE_THRESHOLD'] = app.config.get('CACHE_MAX_ITEMS', 5000)
     app.config.from_mapping(cache_config)
     cache.init_app(app)
     
@@ -22,21 +37,48 @@ def init_cache(app):
         except Exception as e:
             print(f"Warning: Could not initialize cache tracking: {e}")
     
+    # Hit/miss counters are kept in memory and written out periodically
+    start_cache_stats_flusher(app.config.get('CACHE_STATS_FLUSH_INTERVAL', 30))
+    
     return cache
 
+def cache_sizes():
+    # Current entries and bytes per cache type, as far as the backend can tell
+    backend = cache.cache
+    if hasattr(backend, "stats"):
+        return backend.stats()
+    if isinstance(backend, SimpleCache):
+        # The in-memory cache doesn't know which type an entry belongs to
+        return {"general": {"items": len(backend._cache)}}
+    return {}
+
 # Create tracked versions of cache
-def tracked_memoize(timeout=300, cache_type='general'):
+def tracked_memoize(timeout=300, cache_type='general', args_to_ignore=None):
     # A tracks cache usage
+    # A call is a miss if the function body actually ran, otherwise a hit
+    # args_to_ignore are left out of the cache key (pass them positionally)
     def decorator(func):
-        cached_func = cache.memoize(timeout=timeout)(func)
+        calls = threading.local()
+        
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            calls.ran = True
+            return func(*args, **kwargs)
+        
+        cached_func = cache.memoize(timeout=timeout, args_to_ignore=args_to_ignore)(body)
         
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Check if result is coming from cache
-            result = cached_func(*args, **kwargs)
+            calls.ran = False
+            # Entries written during the call are attributed to this cache type
+            with cache_namespace(cache_type):
+                result = cached_func(*args, **kwargs)
             # Record the record for tracking
             try:
-                record_cache_hit(cache_type)
+                if calls.ran:
+                    record_cache_miss(cache_type)
+                else:
+                    record_cache_hit(cache_type)
             except Exception:
                 # Ignore tracking errors (Heh heh heh)
                 pass
@@ -47,4 +89,26 @@ def tracked_memoize(timeout=300, cache_type='general'):
         wrapper.cache_type = cache_type
         return wrapper
     
-    return decorator
\ No newline at end of file
+    return decorator
+
+def clear_all_caches(broadcast=True):
+    # Clear every cached entry in this worker, and in the others if broadcast
+    cache.clear()
+    if broadcast:
+        tba_response_store.clear()
+        invalidation_bus.publish('cache', 'general')
+
+def apply_cache_invalidation(cache_type):
+    # Drop a cache namespace after another worker cleared it
+    # Tracking info is shared on disk, so it was already updated by that worker
+    if not isinstance(cache.cache, SimpleCache):
+        # Shared backends were cleared for everyone by that worker already
+        return
+    if cache_type == 'stats':
+        from app.utils.stats_utils import invalidate_team_stats_cache
+        invalidate_team_stats_cache(broadcast=False)
+    elif cache_type == 'tba':
+        # TBA responses live in the shared response store, nothing to drop here
+        return
+    else:
+        clear_all_caches(broadcast=False)
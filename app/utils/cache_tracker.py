@@ -1,85 +1,236 @@
 import datetime
 import json
 import os
+import atexit
+import threading
+import contextlib
 from flask import current_app
 import traceback
 
+try:
+    import fcntl
+except ImportError:  # Windows dev machines, flushes just aren't serialized there
+    fcntl = None
+
 CACHE_TRACKING_FILE = os.path.join("data", "cache_tracking.json")
+CACHE_TYPES = ('general', 'stats', 'tba')
+
+# Hit, miss and eviction counters live in memory and are flushed to the
+# tracking file every few seconds by a background thread
+#
+# Recording a hit only bumps a number under an in-memory lock, it never
+# touches the disk. A flush writes the difference since the last flush,
+# under a file lock so several workers can flush into the same file.
+#
+# The dashboard's item counts come from the cache backends themselves (see
+# cache_sizes in app.utils.cache), misses and evictions can't tell a
+# replaced or expired entry from a new one.
+_HITS, _MISSES, _EVICTIONS = 0, 1, 2
+_counts = {}  # cache_type -> [hits, misses, evictions] recorded by this process
+_counts_lock = threading.Lock()
+_flushed = {}  # cache_type -> [hits, misses, evictions] already written to disk
+_flush_lock = threading.Lock()
+_flush_thread = None
+_namespace = threading.local()
+
+def _default_entry():
+    return {"last_cleared": None, "item_count": 0, "active": False, "hits": 0, "misses": 0, "evictions": 0}
 
 def ensure_tracking_file():
     # Make sure the tracking file exists
     if not os.path.exists(CACHE_TRACKING_FILE):
         os.makedirs(os.path.dirname(CACHE_TRACKING_FILE), exist_ok=True)
         with open(CACHE_TRACKING_FILE, 'w') as f:
-            json.dump({
-                "general": {"last_cleared": None, "item_count": 0, "active": False},
-                "stats": {"last_cleared": None, "item_count": 0, "active": False},
-                "tba": {"last_cleared": None, "item_count": 0, "active": False}
-            }, f)
+            json.dump({cache_type: _default_entry() for cache_type in CACHE_TYPES}, f)
 
-def get_cache_info():
-    # Get cache tracking information
+def _read_info():
     ensure_tracking_file()
+    with open(CACHE_TRACKING_FILE, 'r') as f:
+        info = json.load(f)
+    for cache_type in CACHE_TYPES:
+        entry = info.setdefault(cache_type, {})
+        for key, value in _default_entry().items():
+            entry.setdefault(key, value)
+    return info
+
+def _write_info(info):
+    # Write atomically so readers never see half a file
+    temp_path = f"{CACHE_TRACKING_FILE}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(info, f)
+    os.replace(temp_path, CACHE_TRACKING_FILE)
+
+@contextlib.contextmanager
+def _file_lock():
+    # Serialize read-modify-write of the tracking file across workers
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(CACHE_TRACKING_FILE), exist_ok=True)
+    with open(f"{CACHE_TRACKING_FILE}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_cache_info():
+    # Get cache tracking information, including counts not flushed yet by this worker
     try:
-        with open(CACHE_TRACKING_FILE, 'r') as f:
-            return json.load(f)
+        with _file_lock():
+            info = _read_info()
     except Exception as e:
         print(f"Error reading cache tracking: {e}")
         # Return default structure on error
-        return {
-            "general": {"last_cleared": None, "item_count": 0, "active": False},
-            "stats": {"last_cleared": None, "item_count": 0, "active": False},
-            "tba": {"last_cleared": None, "item_count": 0, "active": False}
-        }
+        info = {cache_type: _default_entry() for cache_type in CACHE_TYPES}
+
+    for cache_type, delta in _pending_counts().items():
+        entry = info.setdefault(cache_type, _default_entry())
+        entry["hits"] += delta[_HITS]
+        entry["misses"] += delta[_MISSES]
+        entry["evictions"] += delta[_EVICTIONS]
+        if delta[_HITS] or delta[_MISSES]:
+            entry["active"] = True
+    return info
 
 def update_cache_info(cache_type, cleared=False, items=None, active=None):
     # Update cache tracking information
-    # 
+    #
     # Args:
     #     cache_type: 'general', 'stats', or 'tba'
     #     cleared: If True, update last_cleared timestamp
     #     items: If provided, update item count
     #     active: If provided, update active status
     try:
-        ensure_tracking_file()
-        info = get_cache_info()
-        
-        if cleared:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            info[cache_type]["last_cleared"] = timestamp
-            try:
-                from app.utils.logger import log_activity
-                log_activity("Cache Cleared", f"{cache_type.title()} cache was cleared")
-            except Exception:
-                pass
-        
-        if items is not None:
-            info[cache_type]["item_count"] = items
-        
-        if active is not None:
-            info[cache_type]["active"] = active
-            try:
-                from app.utils.logger import log_activity
-                state = "activated" if active else "deactivated"
-                log_activity("Cache Status", f"{cache_type.title()} cache was {state}")
-            except Exception:
-                pass
-        
-        with open(CACHE_TRACKING_FILE, 'w') as f:
-            json.dump(info, f)
-            
+        with _file_lock():
+            info = _read_info()
+            entry = info.setdefault(cache_type, _default_entry())
+
+            if cleared:
+                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                entry["last_cleared"] = timestamp
+                try:
+                    from app.utils.logger import log_activity
+                    log_activity("Cache Cleared", f"{cache_type.title()} cache was cleared")
+                except Exception:
+                    pass
+
+            if items is not None:
+                entry["item_count"] = items
+
+            if active is not None and active != entry["active"]:
+                entry["active"] = active
+                try:
+                    from app.utils.logger import log_activity
+                    state = "activated" if active else "deactivated"
+                    log_activity("Cache Status", f"{cache_type.title()} cache was {state}")
+                except Exception:
+                    pass
+
+            _write_info(info)
+
     except Exception as e:
         print(f"Error updating cache tracking: {e}")
 
+def _bump(cache_type, index, amount=1):
+    with _counts_lock:
+        values = _counts.get(cache_type)
+        if values is None:
+            values = _counts[cache_type] = [0, 0, 0]
+        values[index] += amount
+
 def record_cache_hit(cache_type, key=None):
-    # Record a cache record
+    # Record a call answered from the cache
+    _bump(cache_type, _HITS)
+
+def record_cache_miss(cache_type, key=None):
+    # Record a call that had to run the function and store the result
+    _bump(cache_type, _MISSES)
+
+def record_cache_eviction(cache_type, count=1):
+    # Record entries the cache backend dropped to stay within its limits
+    _bump(cache_type or 'general', _EVICTIONS, count)
+
+def _pending_counts():
+    # Counts recorded in this process since the last flush
+    with _counts_lock:
+        totals = {cache_type: list(values) for cache_type, values in _counts.items()}
+
+    pending = {}
+    for cache_type, total in totals.items():
+        flushed = _flushed.get(cache_type, [0, 0, 0])
+        delta = [total[index] - flushed[index] for index in (_HITS, _MISSES, _EVICTIONS)]
+        if any(delta):
+            pending[cache_type] = delta
+    return pending
+
+def flush_cache_stats():
+    # Add this process's new hits, misses and evictions to the tracking file
+    with _flush_lock:
+        pending = _pending_counts()
+        if not pending:
+            return
+
+        newly_active = []
+        try:
+            with _file_lock():
+                info = _read_info()
+                for cache_type, delta in pending.items():
+                    entry = info.setdefault(cache_type, _default_entry())
+                    entry["hits"] += delta[_HITS]
+                    entry["misses"] += delta[_MISSES]
+                    entry["evictions"] += delta[_EVICTIONS]
+                    if (delta[_HITS] or delta[_MISSES]) and not entry["active"]:
+                        entry["active"] = True
+                        newly_active.append(cache_type)
+                _write_info(info)
+        except Exception as e:
+            print(f"Error flushing cache stats: {e}")
+            return
+
+        for cache_type, delta in pending.items():
+            flushed = _flushed.setdefault(cache_type, [0, 0, 0])
+            for index in (_HITS, _MISSES, _EVICTIONS):
+                flushed[index] += delta[index]
+
+    for cache_type in newly_active:
+        try:
+            from app.utils.logger import log_activity
+            log_activity("Cache Status", f"{cache_type.title()} cache was activated")
+        except Exception:
+            pass
+
+def start_cache_stats_flusher(interval=30):
+    # Flush the counters in the background every interval seconds
+    global _flush_thread
+    if _flush_thread is not None and _flush_thread.is_alive():
+        return
+
+    def run():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            flush_cache_stats()
+
+    _flush_thread = threading.Thread(target=run, name="cache-stats-flush")
+    _flush_thread.daemon = True
+    _flush_thread.start()
+
+    if not getattr(start_cache_stats_flusher, "registered", False):
+        start_cache_stats_flusher.registered = True
+        atexit.register(flush_cache_stats)
+        # Workers forked from a preloaded app don't inherit the thread
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda: start_cache_stats_flusher(interval))
+
+@contextlib.contextmanager
+def cache_namespace(cache_type):
+    # Mark cache writes made inside the block as belonging to cache_type
+    previous = getattr(_namespace, "name", None)
+    _namespace.name = cache_type
     try:
-        # Only update the active status and increment counter if it hasn't been activated yet
-        info = get_cache_info()
-        if not info[cache_type]["active"]:
-            update_cache_info(cache_type, active=True)
-        
-        # Update item count
-        update_cache_info(cache_type, items=info[cache_type]["item_count"] + 1)
-    except Exception as e:
-        print(f"Error recording cache hit: {e}")
\ No newline at end of file
+        yield
+    finally:
+        _namespace.name = previous
+
+def current_cache_namespace():
+    return getattr(_namespace, "name", None) or 'general'
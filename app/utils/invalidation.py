@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+class InvalidationBus:
+    # Tells the other gunicorn workers to drop in-process state
+    #
+    # Each worker keeps its own flask_caching cache, users dict and task list.
+    # When one of them changes shared data it publishes an event on a channel
+    # ("cache", "users", ...) into a small SQLite table. Every worker polls the
+    # table from before_request (at most once per poll interval, and it's a
+    # single primary-key range query) and runs the handlers subscribed to the
+    # channel, so all workers catch up within the poll interval. Events a
+    # worker published itself are skipped, it already applied them.
+    #
+    # The same database holds a small shared key/value table for state that
+    # every worker should see, like background task status.
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            key TEXT,
+            origin TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS shared_state (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )"""
+    ]
+
+    # Events older than this are deleted, every worker has seen them by then
+    RETENTION_SECONDS = 3600
+
+    def __init__(self):
+        self.db_path = None
+        self.poll_interval = 1.0
+        self._pid = None
+        self.origin = None
+        self._handlers = {}  # channel -> [handler(key)]
+        self._last_id = 0
+        self._last_poll = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.db_path = app.config["INVALIDATION_DB"]
+        self.poll_interval = app.config.get("INVALIDATION_POLL_INTERVAL", self.poll_interval)
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.execute("DELETE FROM events WHERE created_at < ?", (time.time() - self.RETENTION_SECONDS,))
+
+        # Only events published after this worker started are relevant
+        self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        app.before_request(self.poll)
+
+    def _connect(self):
+        # One connection per thread, sqlite3 connections can't be shared
+        # Workers forked from a preloaded app get their own origin and connections
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.origin = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, channel, handler):
+        # Call handler(key) when another worker publishes on the channel
+        handlers = self._handlers.setdefault(channel, [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def publish(self, channel, key=None):
+        # Announce a change to every other worker
+        if not self.db_path:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO events (channel, key, origin, created_at) VALUES (?, ?, ?, ?)",
+                    (channel, None if key is None else str(key), self.origin, time.time())
+                )
+        except sqlite3.Error as e:
+            print(f"Error publishing {channel} invalidation: {str(e)}")
+
+    def poll(self, force=False):
+        # Apply events published by other workers since the last poll
+        if not self.db_path:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_poll < self.poll_interval:
+                return
+            self._last_poll = now
+
+            try:
+                conn = self._connect()
+                rows = conn.execute(
+                    "SELECT id, channel, key, origin FROM events WHERE id > ? ORDER BY id",
+                    (self._last_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                print(f"Error polling invalidation events: {str(e)}")
+                return
+
+            for event_id, channel, key, origin in rows:
+                self._last_id = event_id
+                if origin == self.origin:
+                    continue
+                for handler in self._handlers.get(channel, []):
+                    try:
+                        handler(key)
+                    except Exception as e:
+                        print(f"Error handling {channel} invalidation: {str(e)}")
+
+    def set_state(self, name, value):
+        # Store a JSON value every worker can read
+        if not self.db_path:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (name, value, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(value), time.time())
+            )
+
+    def claim_state(self, name, value, can_claim):
+        # Store a shared value only if can_claim(current value) says so, True if it was stored
+        # The check and the write happen in one write transaction, so two
+        # workers can't both claim the same name
+        if not self.db_path:
+            return True
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM shared_state WHERE name = ?", (name,)).fetchone()
+            if not can_claim(json.loads(row[0]) if row else None):
+                conn.rollback()
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state (name, value, updated_at) VALUES (?, ?, ?)",
+                (name, json.dumps(value), time.time())
+            )
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+
+    def get_state(self, name):
+        if not self.db_path:
+            return None
+        row = self._connect().execute("SELECT value FROM shared_state WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_states(self, prefix):
+        # All shared values whose name starts with prefix, keyed by the rest of the name
+        if not self.db_path:
+            return {}
+        rows = self._connect().execute(
+            "SELECT name, value FROM shared_state WHERE substr(name, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()
+        return {name[len(prefix):]: json.loads(value) for name, value in rows}
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import time
+import bisect
+import threading
+
+METRICS_DIR = os.path.join("data", "metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Call counts and latency histograms for outside services (TBA, Drive)
+#
+# Each worker keeps its own numbers in memory and writes a snapshot to
+# data/metrics/<pid>.json every few seconds, and /metrics adds up the
+# snapshots of every worker. Snapshots of workers that have exited are
+# deleted when they're collected, Prometheus sees that as a counter reset.
+_calls = {}  # (service, endpoint) -> {"ok", "error", "sum", "buckets": [...]}
+_lock = threading.Lock()
+_flush_thread = None
+_flush_interval = 15
+
+# A snapshot not rewritten for this many flush intervals is left over from a dead worker
+STALE_AFTER_FLUSHES = 4
+
+def endpoint_label(path):
+    # Collapse IDs in an API path so every team or event doesn't get its own series
+    # team/frc254 -> team/{id}, event/2025wabon/oprs -> event/{id}/oprs
+    return "/".join("{id}" if re.search(r'\d', part) else part for part in path.strip("/").split("/"))
+
+def observe_call(service, endpoint, seconds, ok=True):
+    # Record one call to an outside service
+    with _lock:
+        entry = _calls.get((service, endpoint))
+        if entry is None:
+            entry = _calls[(service, endpoint)] = {
+                "ok": 0, "error": 0, "sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)
+            }
+        entry["ok" if ok else "error"] += 1
+        entry["sum"] += seconds
+        entry["buckets"][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+class timed_call:
+    # Context manager timing a call: with timed_call("tba", endpoint): ...
+    # Counts as an error if the block raises or calls failed()
+
+    def __init__(self, service, endpoint):
+        self.service = service
+        self.endpoint = endpoint
+        self.ok = True
+
+    def failed(self):
+        self.ok = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_call(self.service, self.endpoint, time.perf_counter() - self.started,
+                     self.ok and exc_type is None)
+        return False
+
+def _snapshot():
+    with _lock:
+        return [
+            {"service": service, "endpoint": endpoint, **{key: (list(value) if key == "buckets" else value)
+                                                          for key, value in entry.items()}}
+            for (service, endpoint), entry in _calls.items()
+        ]
+
+def flush_metrics():
+    # Write this worker's numbers for the /metrics endpoint to pick up
+    snapshot = _snapshot()
+    if not snapshot:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error writing metrics snapshot: {str(e)}")
+
+def _is_stale(path, pid):
+    # True if the worker that wrote a snapshot is gone
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    # The pid may have been reused, a live worker rewrites its file every interval
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_AFTER_FLUSHES * _flush_interval
+    except OSError:
+        return True
+
+def collect_calls():
+    # Every worker's call metrics added together, with this worker's live numbers
+    own_file = f"{os.getpid()}.json"
+    merged = {}
+    snapshots = [_snapshot()]
+
+    if os.path.isdir(METRICS_DIR):
+        for filename in os.listdir(METRICS_DIR):
+            if not filename.endswith('.json') or filename == own_file:
+                continue
+            path = os.path.join(METRICS_DIR, filename)
+            try:
+                pid = int(filename[:-len('.json')])
+            except ValueError:
+                continue
+            if _is_stale(path, pid):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, 'r') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, json.JSONDecodeError):
+                continue
+
+    for snapshot in snapshots:
+        for entry in snapshot:
+            key = (entry["service"], entry["endpoint"])
+            total = merged.setdefault(key, {"ok": 0, "error": 0, "sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)})
+            total["ok"] += entry["ok"]
+            total["error"] += entry["error"]
+            total["sum"] += entry["sum"]
+            for index, count in enumerate(entry["buckets"][:len(total["buckets"])]):
+                total["buckets"][index] += count
+    return merged
+
+def init_metrics(app):
+    # Start writing this worker's snapshot periodically
+    global _flush_thread, _flush_interval
+    interval = _flush_interval = app.config.get("METRICS_FLUSH_INTERVAL", 15)
+    if _flush_thread is not None and _flush_thread.is_alive():
+        return
+
+    def run():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            flush_metrics()
+
+    _flush_thread = threading.Thread(target=run, name="metrics-flush")
+    _flush_thread.daemon = True
+    _flush_thread.start()
+
+    if not getattr(init_metrics, "registered", False):
+        init_metrics.registered = True
+        # Workers forked from a preloaded app don't inherit the thread
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda: init_metrics(app))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class MetricsWriter:
+    # Builds a Prometheus text exposition document
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        # samples: iterable of (labels dict, value)
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def histogram(self, name, help_text, series):
+        # series: iterable of (labels dict, {"buckets", "sum"})
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, entry in series:
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), entry["buckets"]):
+                cumulative += count
+                self.lines.append(f"{name}_bucket{_format_labels(dict(labels, le=bound))} {cumulative}")
+            self.lines.append(f"{name}_sum{_format_labels(labels)} {round(entry['sum'], 6)}")
+            self.lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
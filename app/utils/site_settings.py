@@ -1,38 +1,147 @@
+import os
+import copy
 import json
+import time
 import datetime
+import threading
 from flask import current_app
-from app.services.drive_service import find_file_by_name, download_file_from_drive, upload_to_drive
+from app.services.storage_backend import get_storage_backend
+from app.services.upload_queue import upload_queue
 
-def get_site_settings():
-    # Retrieves site-wide settings from Google Drive or uses default if none exist
-    drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
-    file_info = find_file_by_name("site_settings.json", drive_folder_id)
-    
-    if file_info:
-        # Download existing settings
-        content = download_file_from_drive(file_info['id'])
-        if content:
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                # Create new if its corrupt or something
-                pass
-    
-    # Default settings
-    default_settings = {
+SETTINGS_FILE = "site_settings.json"
+LOCAL_SETTINGS_PATH = os.path.join("data", "site_settings.json")
+VERSION_PATH = os.path.join("data", "site_settings.version")
+
+# Settings are read on almost every page, so they are kept in memory
+#
+# The local copy in data/site_settings.json is what pages are served from.
+# Saving settings rewrites it and the version stamp, and every worker
+# compares the stamp on each read, so an admin change shows up in all
+# of them straight away. Drive is only asked again once the TTL runs out, in
+# a background thread, so a slow or unreachable Drive never holds up a page.
+_settings = None
+_version = None
+_loaded_at = 0
+_refreshing = False
+_lock = threading.Lock()
+
+def _default_settings():
+    return {
         "active_events": ["2025wabon", "2025wasno"],  # Default events
         "default_event": "2025wabon",                 # Global default event
         "events_last_updated": datetime.datetime.now().isoformat(),
         "system_notice": ""
     }
-    
-    # Save default settings to drive
-    upload_to_drive(default_settings, "site_settings.json", drive_folder_id)
-    return default_settings
+
+def _read_version():
+    try:
+        with open(VERSION_PATH, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _bump_version():
+    # Tell every worker that the local copy changed
+    with open(VERSION_PATH, 'w') as f:
+        f.write(str(time.time_ns()))
+
+def _read_local():
+    try:
+        with open(LOCAL_SETTINGS_PATH, 'r') as f:
+            settings = json.load(f)
+        return settings if isinstance(settings, dict) else None
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _write_local(settings):
+    # Write atomically so other workers never read half a file
+    temp_path = f"{LOCAL_SETTINGS_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(settings, f, indent=2)
+    os.replace(temp_path, LOCAL_SETTINGS_PATH)
+
+def _fetch_remote(drive_folder_id):
+    # Settings from Drive, or None if they are missing or unreadable
+    content = get_storage_backend().get_by_name(SETTINGS_FILE, drive_folder_id)
+    if not content:
+        return None
+    try:
+        settings = json.loads(content)
+        return settings if isinstance(settings, dict) else None
+    except json.JSONDecodeError:
+        # Corrupt file on Drive, keep what we have
+        print("Ignoring corrupt site_settings.json on Drive")
+        return None
+
+def _refresh_from_remote(drive_folder_id):
+    # Pull the settings from Drive into the local copy if they changed
+    global _refreshing, _loaded_at
+    try:
+        # A local save that hasn't been uploaded yet is newer than Drive's copy
+        if upload_queue.is_pending(SETTINGS_FILE, drive_folder_id):
+            return
+        settings = _fetch_remote(drive_folder_id)
+        if settings is not None and settings != _read_local():
+            _write_local(settings)
+            _bump_version()
+    except Exception as e:
+        print(f"Error refreshing site settings from Drive: {str(e)}")
+    finally:
+        with _lock:
+            _loaded_at = time.monotonic()
+            _refreshing = False
+
+def get_site_settings():
+    # Retrieves site-wide settings (cached, refreshed from Google Drive in the background)
+    global _settings, _version, _loaded_at, _refreshing
+    drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
+    ttl = current_app.config.get("SITE_SETTINGS_TTL", 300)
+
+    version = _read_version()
+    with _lock:
+        if _settings is None or version != _version:
+            local = _read_local()
+            if local is not None:
+                _settings = local
+                _version = version
+                if not _loaded_at:
+                    _loaded_at = time.monotonic()
+
+        cold = _settings is None
+        if not cold and not _refreshing and time.monotonic() - _loaded_at >= ttl:
+            _refreshing = True
+            threading.Thread(target=_refresh_from_remote, args=(drive_folder_id,), daemon=True).start()
+
+    if cold:
+        # First start with no local copy, the only time a page waits for Drive
+        settings = _fetch_remote(drive_folder_id)
+        with _lock:
+            _loaded_at = time.monotonic()
+            if settings is None:
+                # Nothing saved yet (or Drive is down), serve defaults without
+                # writing them anywhere and try Drive again after the TTL
+                _settings = _default_settings()
+            else:
+                _write_local(settings)
+                _settings = settings
+            _version = _read_version()
+
+    # Callers edit the dict before saving it, so never hand out the cached one
+    with _lock:
+        return copy.deepcopy(_settings)
 
 def save_site_settings(settings):
-    # Saves site-wide settings to Google Drive
+    # Saves site-wide settings locally and queues the Google Drive backup
+    global _settings, _version, _loaded_at
     drive_folder_id = current_app.config["GOOGLE_DRIVE_FOLDER_ID"]
     settings["events_last_updated"] = datetime.datetime.now().isoformat()
-    result = upload_to_drive(settings, "site_settings.json", drive_folder_id)
-    return result
\ No newline at end of file
+
+    with _lock:
+        _write_local(settings)
+        _bump_version()
+        _settings = copy.deepcopy(settings)
+        _version = _read_version()
+        _loaded_at = time.monotonic()
+
+    upload_queue.enqueue(SETTINGS_FILE, settings, drive_folder_id)
+    return True
@@ -0,0 +1,195 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from flask_caching.backends.base import BaseCache
+from app.utils.cache_tracker import current_cache_namespace, record_cache_eviction
+
+class SQLiteCache(BaseCache):
+    # flask_caching backend that keeps entries in a SQLite file
+    #
+    # Every gunicorn worker opens the same database (WAL mode), so a TBA
+    # response or team stats fetched by one worker is a hit for all of them,
+    # and the cache survives restarts. The store is bounded by an entry count
+    # and a total size; when either is exceeded, expired entries go first and
+    # then the least recently used ones. Access times are only written back
+    # once they are more than a few seconds old, so hot reads stay read-only.
+    # Each entry remembers the cache type (tba, stats, ...) it was written
+    # under, so evictions can be counted per cache type.
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            expires REAL NOT NULL,
+            accessed REAL NOT NULL,
+            size INTEGER NOT NULL,
+            namespace TEXT NOT NULL DEFAULT 'general'
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed)"
+    ]
+
+    # How stale an entry's access time may get before a read updates it
+    TOUCH_INTERVAL = 10
+    # Check the size limits once every this many writes
+    PRUNE_EVERY = 25
+    # Evict down to this fraction of the limits so pruning doesn't run on every write
+    PRUNE_TARGET = 0.9
+
+    def __init__(self, path, default_timeout=300, max_items=5000, max_bytes=64 * 1024 * 1024):
+        super().__init__(default_timeout)
+        self.path = path
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._writes = 0
+        self._pid = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            # Databases created before entries had a namespace
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+            if "namespace" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN namespace TEXT NOT NULL DEFAULT 'general'")
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            max_items=config.get("CACHE_MAX_ITEMS", 5000),
+            max_bytes=config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+        )
+        return cls(config["CACHE_DB"], *args, **kwargs)
+
+    def _connect(self):
+        # One connection per thread, and new ones after a fork
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else 0
+
+    def get(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires, accessed = row
+        if expires and expires <= now:
+            self.delete(key)
+            return None
+
+        if now - accessed > self.TOUCH_INTERVAL:
+            self._connect().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+
+        try:
+            return pickle.loads(value)
+        except (pickle.PickleError, EOFError, AttributeError, ImportError):
+            # Written by an incompatible version of the code
+            self.delete(key)
+            return None
+
+    def set(self, key, value, timeout=None):
+        return self._write("INSERT OR REPLACE", key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        # Only set the key if it isn't there (or has expired)
+        now = time.time()
+        self._connect().execute("DELETE FROM cache WHERE key = ? AND expires > 0 AND expires <= ?", (key, now))
+        return self._write("INSERT OR IGNORE", key, value, timeout)
+
+    def _write(self, verb, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        try:
+            cursor = self._connect().execute(
+                f"{verb} INTO cache (key, value, expires, accessed, size, namespace) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(data), self._expiry(timeout), now, len(data), current_cache_namespace())
+            )
+        except sqlite3.Error as e:
+            print(f"Error writing cache entry {key}: {str(e)}")
+            return False
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.PRUNE_EVERY == 0
+        if due:
+            self._prune()
+        return cursor.rowcount > 0
+
+    def _prune(self):
+        # Drop expired entries, then the least recently used until under the limits
+        conn = self._connect()
+        now = time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            removed = {}
+            for namespace, expired in conn.execute(
+                "SELECT namespace, COUNT(*) FROM cache WHERE expires > 0 AND expires <= ? GROUP BY namespace", (now,)
+            ).fetchall():
+                removed[namespace] = expired
+            conn.execute("DELETE FROM cache WHERE expires > 0 AND expires <= ?", (now,))
+
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+            if count > self.max_items or total > self.max_bytes:
+                target_count = int(self.max_items * self.PRUNE_TARGET)
+                target_bytes = int(self.max_bytes * self.PRUNE_TARGET)
+                doomed = []
+                for key, size, namespace in conn.execute("SELECT key, size, namespace FROM cache ORDER BY accessed"):
+                    if count <= target_count and total <= target_bytes:
+                        break
+                    doomed.append((key,))
+                    removed[namespace] = removed.get(namespace, 0) + 1
+                    count -= 1
+                    total -= size
+                conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            print(f"Error pruning cache: {str(e)}")
+            return
+
+        with self._lock:
+            self.evictions += sum(removed.values())
+        for namespace, evicted in removed.items():
+            record_cache_eviction(namespace, evicted)
+
+    def delete(self, key):
+        return self._connect().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def has(self, key):
+        row = self._connect().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+        return True
+
+    def stats(self):
+        # Entry count and total size per cache type, for the admin dashboard
+        return {
+            namespace: {"items": count, "bytes": total}
+            for namespace, count, total in self._connect().execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM cache GROUP BY namespace"
+            )
+        }
@@ -1,11 +1,31 @@
 from app.utils.cache import cache, tracked_memoize
 from app.utils.cache_tracker import get_cache_info, update_cache_info
-import hashlib
-import json
+from app.utils.invalidation import invalidation_bus
 
-@tracked_memoize(timeout=3600, cache_type='stats')  # Cache for 1 hour
-def generate_team_stats(reports):
+# Shared state entry holding a team's stats version, bumped on every submit
+STATS_VERSION_PREFIX = "team_stats_version:"
+
+def generate_team_stats(reports, team_number=None, event=None):
     # Generate team statistics from reports with caching
+    #
+    # The cache key is (team, event, data version) instead of the reports
+    # themselves, so a hit doesn't serialize the whole list. The data version
+    # is the team's submit counter plus the number of reports, which also
+    # catches reports that arrive through a Drive sync.
+    if team_number is None or not isinstance(reports, list):
+        return compute_team_stats(reports)
+    version = f"{team_stats_version(team_number)}:{len(reports)}"
+    return _cached_team_stats(str(team_number), event, version, reports)
+
+@tracked_memoize(timeout=3600, cache_type='stats', args_to_ignore=("reports",))  # Cache for 1 hour
+def _cached_team_stats(team_number, event, version, reports):
+    return compute_team_stats(reports)
+
+def team_stats_version(team_number):
+    return invalidation_bus.get_state(f"{STATS_VERSION_PREFIX}{team_number}") or 0
+
+def compute_team_stats(reports):
+    # Team statistics from a list of reports, uncached
 
     # Create a simple stats object
     stats = {
@@ -121,10 +141,17 @@ def generate_team_stats(reports):
     
     return stats
 
-def invalidate_team_stats_cache(team_number=None):
+def invalidate_team_stats_cache(team_number=None, broadcast=True):
     # Invalidate the team stats cache for a specific team or all teams
-    # MUH HA HA HA HA. STUPID ERROR GONE
-    cache.delete_memoized(generate_team_stats)
+    if team_number is not None:
+        # Bumping the version makes every worker miss on this team only,
+        # the old entries age out of the cache on their own
+        invalidation_bus.set_state(f"{STATS_VERSION_PREFIX}{team_number}", team_stats_version(team_number) + 1)
+        return
+    
+    cache.delete_memoized(_cached_team_stats)
     
-    # Update cache tracking info
-    update_cache_info('stats', cleared=True, active=False, items=0)
\ No newline at end of file
+    if broadcast:
+        # Update cache tracking info and tell the other workers
+        update_cache_info('stats', cleared=True, active=False, items=0)
+        invalidation_bus.publish('cache', 'stats')
\ No newline at end of file
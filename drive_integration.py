@@ -1,155 +1,389 @@
 import os
 import json
 import io
-import uuid
-import time
+import threading
+import contextlib
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 from dotenv import load_dotenv
 
 load_dotenv()
 
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive.file']
+
+# Drive clients are expensive to build, so they are cached
+# Credentials are shared by every client and google-auth only refreshes them
+# once the access token has expired. httplib2 isn't thread-safe, so each thread
+# gets its own client built from a discovery document parsed once per process.
+_credentials = None
+_discovery_doc = None
+_client_lock = threading.Lock()
+_thread_clients = threading.local()
+
+def _get_credentials():
+    # Load the service account credentials once
+    global _credentials
+    with _client_lock:
+        if _credentials is None:
+            creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
+            if not creds_json:
+                return None
+            
+            credentials_dict = json.loads(creds_json)
+            _credentials = service_account.Credentials.from_service_account_info(credentials_dict, scopes=DRIVE_SCOPES)
+        return _credentials
+
+def _get_discovery_doc():
+    # The Drive v3 discovery document bundled with googleapiclient, loaded once
+    global _discovery_doc
+    with _client_lock:
+        if _discovery_doc is None:
+            _discovery_doc = discovery_cache.get_static_doc('drive', 'v3')
+        return _discovery_doc
+
 def get_drive_service():
+    # Get this thread's Google Drive client, building it on first use
     try:
-        creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
-        if not creds_json:
+        credentials = _get_credentials()
+        if not credentials:
             print("Google Drive credentials not found in environment.")
             return None
-            
-        credentials_dict = json.loads(creds_json)
-        credentials = service_account.Credentials.from_service_account_info(credentials_dict, scopes=['https://www.googleapis.com/auth/drive.file'])
         
-        drive_service = build('drive', 'v3', credentials=credentials)
+        drive_service = getattr(_thread_clients, "service", None)
+        if drive_service is not None and getattr(_thread_clients, "credentials", None) is credentials:
+            return drive_service
+        
+        discovery_doc = _get_discovery_doc()
+        if discovery_doc:
+            drive_service = build_from_document(discovery_doc, credentials=credentials)
+        else:
+            drive_service = build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        
+        _thread_clients.service = drive_service
+        _thread_clients.credentials = credentials
         return drive_service
     
     except Exception as e:
         print(f"Error creating Drive service: {str(e)}")
         return None
 
-def upload_to_drive(file_content, file_name, folder_id=None):
-    try:
-        service = get_drive_service()
-        if not service:
-            print("Failed to get Drive service")
-            return None
-            
-        file_metadata = {'name': file_name}
-        if folder_id:
-            file_metadata['parents'] = [folder_id]
+def reset_drive_service():
+    # Drop the cached credentials and clients (e.g. after the credentials change)
+    global _credentials
+    with _client_lock:
+        _credentials = None
+    _thread_clients.service = None
+    _thread_clients.credentials = None
+
+# Uploads at or below this size go up in a single request
+SIMPLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+RESUMABLE_CHUNK_SIZE = 1024 * 1024
+
+def encode_content(file_content):
+    # Bytes for an upload, dicts and lists are stored as indented JSON
+    if isinstance(file_content, dict) or isinstance(file_content, list):
+        file_content = json.dumps(file_content, indent=2)
+    if isinstance(file_content, str):
+        return file_content.encode('utf-8')
+    if isinstance(file_content, bytes):
+        return file_content
+    return str(file_content).encode('utf-8')
+
+def build_media_upload(file_content, mimetype='application/json'):
+    # Wrap content in an in-memory upload body (no temp files)
+    file_content = encode_content(file_content)
+    
+    # Small JSON files don't need the extra round-trip of a resumable session
+    resumable = len(file_content) > SIMPLE_UPLOAD_LIMIT
+    return MediaIoBaseUpload(
+        io.BytesIO(file_content),
+        mimetype=mimetype,
+        chunksize=RESUMABLE_CHUNK_SIZE if resumable else -1,
+        resumable=resumable
+    )
+
+class DriveFileIdCache:
+    # Persistent name -> Drive file ID mapping, per folder
+    #
+    # Lets uploads and downloads by name skip the files().list lookup. Filled by
+    # uploads, lookups and folder listings, and entries are dropped when Drive
+    # answers 404 for their ID. Saved to disk so it survives restarts and is
+    # reloaded when another worker has written it.
+    
+    def __init__(self, path=os.path.join("data", "drive_file_ids.json")):
+        self.path = path
+        self._ids = {}  # folder_id -> {name: file_id}
+        self._mtime = None
+        self._lock = threading.Lock()
+    
+    def get(self, file_name, folder_id=None):
+        with self._lock:
+            self._reload()
+            return self._ids.get(folder_id or "", {}).get(file_name)
+    
+    def set(self, file_name, file_id, folder_id=None):
+        self.set_many({file_name: file_id}, folder_id)
+    
+    def set_many(self, names_to_ids, folder_id=None):
+        # Record several names at once (e.g. from a folder listing)
+        with self._lock:
+            self._reload()
+            folder = self._ids.setdefault(folder_id or "", {})
+            changed = {name: file_id for name, file_id in names_to_ids.items() if folder.get(name) != file_id}
+            if changed:
+                folder.update(changed)
+                self._save()
+    
+    def invalidate(self, file_name=None, folder_id=None, file_id=None):
+        # Forget a name, or every name pointing at file_id
+        with self._lock:
+            self._reload()
+            changed = False
+            for folder_key, folder in self._ids.items():
+                if file_name is not None and folder_key != (folder_id or ""):
+                    continue
+                for name, cached_id in list(folder.items()):
+                    if name == file_name or (file_id is not None and cached_id == file_id):
+                        del folder[name]
+                        changed = True
+            if changed:
+                self._save()
+    
+    def _reload(self):
+        # Re-read the file if it changed since we last loaded it
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
         
-        # Create a unique temporary filename to avoid conflicts
-        unique_id = str(uuid.uuid4())[:8]
-        temp_path = f"temp_{unique_id}_{file_name}"
+        if mtime == self._mtime:
+            return
         
-        # Create a temporary file to upload
         try:
-            with open(temp_path, 'w') as f:
-                if isinstance(file_content, dict) or isinstance(file_content, list):
-                    json.dump(file_content, f, indent=2)
-                else:
-                    f.write(str(file_content))
-        except Exception as e:
-            print(f"Error writing temp file: {str(e)}")
-            return None
-            
+            with open(self.path, 'r') as f:
+                self._ids = json.load(f)
+            self._mtime = mtime
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading Drive file ID cache: {str(e)}")
+    
+    def _save(self):
+        # Write atomically so other workers never read a partial file
         try:
-            # Upload to Drive
-            media = MediaFileUpload(temp_path, mimetype='application/json')
-            
-            # Check if file already exists
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self._ids, f)
+            os.replace(temp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            print(f"Error saving Drive file ID cache: {str(e)}")
+
+drive_file_ids = DriveFileIdCache()
+
+# Uploads of the same file name take turns, see put_file
+_name_locks = {}  # (folder_id, name) -> [lock, threads holding or waiting for it]
+_name_locks_guard = threading.Lock()
+
+@contextlib.contextmanager
+def _file_name_lock(file_name, folder_id=None):
+    # Per-name lock, dropped again once nobody is waiting on it
+    key = (folder_id or "", file_name)
+    with _name_locks_guard:
+        slot = _name_locks.get(key)
+        if slot is None:
+            slot = _name_locks[key] = [threading.Lock(), 0]
+        slot[1] += 1
+    try:
+        with slot[0]:
+            yield
+    finally:
+        with _name_locks_guard:
+            slot[1] -= 1
+            if slot[1] == 0:
+                del _name_locks[key]
+
+def is_not_found_error(error):
+    # True if a Drive API error means the file ID no longer exists
+    return isinstance(error, HttpError) and error.resp.status == 404
+
+def is_rate_limit_error(error):
+    # True if Drive is asking us to slow down (429, or 403 with a rate limit reason)
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and 'rateLimitExceeded' in str(error.content)
+
+def is_retryable_error(error):
+    # True for errors worth retrying: rate limits, server errors and dropped connections
+    if isinstance(error, HttpError):
+        return is_rate_limit_error(error) or error.resp.status >= 500
+    return isinstance(error, (OSError, TimeoutError))
+
+def put_file(file_content, file_name, folder_id=None, fields='id', mimetype='application/json'):
+    # Create or update a file by name, raising on API errors
+    # Returns the requested metadata fields of the uploaded file
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service is not available")
+    
+    file_metadata = {'name': file_name}
+    if folder_id:
+        file_metadata['parents'] = [folder_id]
+    
+    # Find-then-create under a per-name lock, otherwise a queued upload and
+    # a sync upload of the same report could both miss and create two files.
+    # The created ID goes into the ID cache before the lock is released, so
+    # the next writer (in any worker) updates that file instead.
+    with _file_name_lock(file_name, folder_id):
+        for attempt in range(2):
+            # Check if file already exists (usually answered from the ID cache)
             existing_file = find_file_by_name(file_name, folder_id)
             
-            if existing_file:
-                # Update existing file
-                file = service.files().update(
-                    fileId=existing_file['id'],
-                    media_body=media).execute()
-                file_id = existing_file['id']
-            else:
+            if not existing_file:
                 # Create new file
                 file = service.files().create(
                     body=file_metadata,
-                    media_body=media,
-                    fields='id').execute()
-                file_id = file.get('id')
-            
-            print(f"File uploaded to Drive with ID: {file_id}")
-            return file_id
-            
-        finally:
-            # Always try to clean up the temp file with retry mechanism
-            for attempt in range(5):  # Try up to 5 times
-                try:
-                    if os.path.exists(temp_path):
-                        # Close any potential file handles
-                        media._fd.close()
-                        os.close(os.open(temp_path, os.O_RDONLY))
-                        # Remove the file
-                        os.remove(temp_path)
-                    break  # If successful, exit the retry loop
-                except Exception as e:
-                    print(f"Error removing temp file (attempt {attempt+1}): {str(e)}")
-                    time.sleep(0.5)  # Wait half a second before trying again
+                    media_body=build_media_upload(file_content, mimetype),
+                    fields=fields).execute()
+                drive_file_ids.set(file_name, file['id'], folder_id)
+                return file
             
-            # If we still couldn't delete it after all attempts, just log it
-            if os.path.exists(temp_path):
-                print(f"Warning: Could not remove temporary file {temp_path}")
+            try:
+                # Update existing file
+                file = service.files().update(
+                    fileId=existing_file['id'],
+                    media_body=build_media_upload(file_content, mimetype),
+                    fields=fields).execute()
+                file.setdefault('id', existing_file['id'])
+                return file
+            except HttpError as e:
+                if attempt or not is_not_found_error(e):
+                    raise
+                # The cached ID is stale, look the name up again
+                drive_file_ids.invalidate(file_name, folder_id)
+
+def upload_to_drive(file_content, file_name, folder_id=None, mimetype='application/json'):
+    try:
+        file_id = put_file(file_content, file_name, folder_id, mimetype=mimetype)['id']
+        print(f"File uploaded to Drive with ID: {file_id}")
+        return file_id
     
     except Exception as e:
         print(f"Error uploading to Drive: {str(e)}")
         return None
 
+def list_files_page(folder_id=None, page_size=100, page_token=None, fields='nextPageToken, files(id, name)'):
+    # List one page of JSON files in a folder, raising on API errors
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service is not available")
+    
+    query = f"'{folder_id}' in parents and mimeType='application/json'" if folder_id else "mimeType='application/json'"
+    
+    results = service.files().list(
+        q=query,
+        spaces='drive',
+        fields=fields,
+        pageSize=page_size,
+        pageToken=page_token
+    ).execute()
+    
+    files = results.get('files', [])
+    drive_file_ids.set_many({file['name']: file['id'] for file in files}, folder_id)
+    
+    return {
+        "files": files,
+        "nextPageToken": results.get('nextPageToken')
+    }
+
 def get_all_files_from_drive(folder_id=None, page_size=100, page_token=None):
     # Get files from a Google Drive folder with pagination
     try:
-        service = get_drive_service()
-        if not service:
-            return {"files": [], "nextPageToken": None}
-        
-        query = f"'{folder_id}' in parents and mimeType='application/json'" if folder_id else "mimeType='application/json'"
-        
-        # Use pagination to get files in smaller batches
-        results = service.files().list(
-            q=query,
-            spaces='drive',
-            fields='nextPageToken, files(id, name)',
-            pageSize=page_size,
-            pageToken=page_token
-        ).execute()
-        
-        return {
-            "files": results.get('files', []),
-            "nextPageToken": results.get('nextPageToken')
-        }
-    
+        return list_files_page(folder_id, page_size, page_token)
     except Exception as e:
         print(f"Error retrieving files from Drive: {str(e)}")
         return {"files": [], "nextPageToken": None}
 
+def get_changes_start_token():
+    # Get the Drive changes feed token for "now", raising on API errors
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service is not available")
+    
+    return service.changes().getStartPageToken().execute().get('startPageToken')
+
+def list_changes_page(page_token, page_size=1000):
+    # List one page of the Drive changes feed, raising on API errors
+    # The last page carries newStartPageToken instead of nextPageToken
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service is not available")
+    
+    results = service.changes().list(
+        pageToken=page_token,
+        spaces='drive',
+        pageSize=page_size,
+        fields='nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, parents, mimeType, trashed, md5Checksum, modifiedTime))'
+    ).execute()
+    
+    return {
+        "changes": results.get('changes', []),
+        "nextPageToken": results.get('nextPageToken'),
+        "newStartPageToken": results.get('newStartPageToken')
+    }
+
+def fetch_file_bytes(file_id):
+    # Download a file's raw bytes, raising on API errors
+    service = get_drive_service()
+    if not service:
+        raise RuntimeError("Google Drive service is not available")
+    
+    request = service.files().get_media(fileId=file_id)
+    file_content = io.BytesIO()
+    downloader = MediaIoBaseDownload(file_content, request)
+    
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+    
+    return file_content.getvalue()
+
 def download_file_from_drive(file_id):
     # Download a file from Google Drive by ID
     try:
-        service = get_drive_service()
-        if not service:
-            return None
-            
-        request = service.files().get_media(fileId=file_id)
-        file_content = io.BytesIO()
-        downloader = MediaIoBaseDownload(file_content, request)
-        
-        done = False
-        while not done:
-            _, done = downloader.next_chunk()
-            
-        return file_content.getvalue().decode('utf-8')
+        return fetch_file_bytes(file_id).decode('utf-8')
     
     except Exception as e:
+        if is_not_found_error(e):
+            drive_file_ids.invalidate(file_id=file_id)
         print(f"Error downloading file from Drive: {str(e)}")
         return None
 
+def download_file_by_name(file_name, folder_id=None):
+    # Download a file by name, using the ID cache and retrying once if the cached ID is stale
+    file_info = find_file_by_name(file_name, folder_id)
+    if not file_info:
+        return None
+    
+    content = download_file_from_drive(file_info['id'])
+    if content is None and drive_file_ids.get(file_name, folder_id) is None:
+        # The cached ID was dropped after a 404, so look it up again
+        file_info = find_file_by_name(file_name, folder_id)
+        if file_info:
+            content = download_file_from_drive(file_info['id'])
+    
+    return content
+
 def find_file_by_name(file_name, folder_id=None):
     # Find a file by name in Google Drive
+    cached_id = drive_file_ids.get(file_name, folder_id)
+    if cached_id:
+        return {'id': cached_id, 'name': file_name}
+    
     try:
         service = get_drive_service()
         if not service:
@@ -167,9 +401,10 @@ def find_file_by_name(file_name, folder_id=None):
         
         files = results.get('files', [])
         if files:
+            drive_file_ids.set(file_name, files[0]['id'], folder_id)
             return files[0]
         return None
     
     except Exception as e:
         print(f"Error finding file in Drive: {str(e)}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+from flask import Flask
+
+def test_first_save_keeps_reports_already_on_drive(tmp_path, monkeypatch):
+    # A fresh instance (empty data/) saving into an hour Drive already has a
+    # segment for must not replace that segment with just its own report
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path / "drive"))
+    monkeypatch.setenv("UPLOAD_QUEUE_POLL_INTERVAL", "3600")
+    os.makedirs(os.path.join("data", "reports"))
+
+    from app.services.storage_backend import init_storage_backend, get_storage_backend
+    from app.services.archive_service import ReportArchive, ARCHIVE_INDEX_NAME
+    from app.services.upload_queue import upload_queue
+
+    app = Flask(__name__)
+    app.config.update(STORAGE_BACKEND="local", STORAGE_LOCAL_DIR=str(tmp_path / "drive"),
+                      GOOGLE_DRIVE_FOLDER_ID="scouting")
+    init_storage_backend(app)
+    backend = get_storage_backend()
+
+    # Another instance already backed up teams 111 and 222
+    app.config["ARCHIVE_DIR"] = str(tmp_path / "other_archive")
+    other = ReportArchive()
+    other.init_app(app)
+    for team in (111, 222):
+        segment = other.append(f"{team}_20250301_101500.json", {"team_number": team, "event": "2025test"})
+    for name in (segment, ARCHIVE_INDEX_NAME):
+        with open(os.path.join(other.archive_dir, name), 'rb') as f:
+            backend.put(f.read(), name, "scouting")
+
+    # This instance starts with an empty archive and saves team 333 in the same hour
+    app.config["ARCHIVE_DIR"] = str(tmp_path / "archive")
+    archive = ReportArchive()
+    archive.init_app(app)
+    segment = archive.append("333_20250301_104500.json", {"team_number": 333, "event": "2025test"})
+    archive.enqueue_upload(upload_queue, "scouting", [segment])
+
+    deadline = time.time() + 10
+    while upload_queue.stats()["depth"] and time.time() < deadline:
+        upload_queue.drain()
+        time.sleep(0.05)
+    assert upload_queue.stats()["depth"] == 0
+
+    remote = ReportArchive.read_segment(backend.get(backend.find(segment, "scouting")["id"]))
+    assert {report["team_number"] for report in remote.values()} == {111, 222, 333}
+
+    remote_index = json.loads(backend.get_by_name(ARCHIVE_INDEX_NAME, "scouting"))["segments"]
+    assert remote_index[segment]["reports"] == [
+        "111_20250301_101500.json", "222_20250301_101500.json", "333_20250301_104500.json"
+    ]